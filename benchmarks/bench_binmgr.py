@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of binmgr against a local fake GitHub server.
+
+For each program count, runs BinMgr end to end three times in a throwaway HOME:
+  cold    - nothing installed, every program is downloaded and installed
+  warm    - nothing changed, every release lookup is answered with 304
+  update  - a new release of every program, downloaded again
+and reports wall time with the per-phase totals of the run report. Asset selection, archive extraction and
+finding the binary are also timed on their own. Results are appended to a JSON lines file, and `--compare`
+shows the change from the last stored result with the same parameters.
+
+    python benchmarks/bench_binmgr.py --programs 1,10,50,200 --latency-ms 20 --compare
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / 'src'
+DEFAULT_RESULTS = BENCH_DIR / 'results' / 'bench_binmgr.jsonl'
+RUNS = ('cold', 'warm', 'update')
+
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_github import FakeGitHub, build_archive, make_payload  # noqa: E402
+
+
+def median_ms(function: Callable[[], object], repeat: int) -> float:
+    """Median wall time of a call in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def run_binmgr(config_path: Path, home: Path, jobs: int, stream: bool, force: bool = False) -> Dict:
+    """Run one update in-process and return its timings"""
+    from main import BinMgr
+
+    os.environ['HOME'] = str(home)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = BinMgr(str(config_path), jobs=jobs, stream=stream, force=force)
+        bot.run()
+    seconds = time.perf_counter() - start
+    report = bot.report.to_dict()
+    return {
+        'seconds': round(seconds, 4),
+        'failed': len(bot.failed_programs),
+        'phases': {phase: round(total['seconds'], 4) for phase, total in report['phases'].items()},
+        'counters': report['counters'],
+    }
+
+
+def bench_end_to_end(program_count: int, args) -> List[Dict]:
+    """Cold, warm and update runs for one program count"""
+    results = []
+    with FakeGitHub(program_count, args.archive_kb, args.members, args.latency_ms) as fake, \
+            tempfile.TemporaryDirectory() as temp_dir:
+        home = Path(temp_dir)
+        config_path = home / 'config.json'
+        config_path.write_text(json.dumps({
+            'programs': {name: f'bench/{name}' for name in fake.program_names},
+            'api_url': fake.url,
+            'cache_dir': str(home / 'cache'),
+            'log_level': args.log_level,
+        }))
+
+        for run in RUNS:
+            if run == 'update':
+                fake.tag = 'v1.0.1'
+            result = run_binmgr(config_path, home, args.jobs, args.stream)
+            result.update(programs=program_count, run=run)
+            results.append(result)
+            print(f"{program_count:>5} programs  {run:<7} {result['seconds'] * 1000:9.1f} ms"
+                  + (f"  ({result['failed']} failed)" if result['failed'] else ""))
+    return results
+
+
+def bench_components(args) -> Dict[str, float]:
+    """Time asset selection, extraction and binary search on their own"""
+    from binary_manager import BinaryManager
+    from github_api import GitHubAPI
+    from logger import Logger
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir, contextlib.redirect_stdout(io.StringIO()):
+        temp_path = Path(temp_dir)
+        logger = Logger(temp_path / 'logs', args.log_level)
+        github = GitHubAPI(logger, api_url='http://127.0.0.1:9')
+        binary_manager = BinaryManager(temp_path / 'bin', temp_path / 'temp', logger)
+
+        # A release with many platform builds, only one of which fits
+        platforms = ['darwin-amd64', 'darwin-arm64', 'windows-amd64', 'windows-arm64', 'freebsd-amd64',
+                     'linux-armv7', 'linux-i686', 'linux-ppc64le', 'linux-s390x', 'linux-riscv64']
+        assets = [{'name': f'tool-v1.0.0-{platform_name}.{archive_format}', 'size': 1,
+                   'browser_download_url': 'http://127.0.0.1:9/x'}
+                  for platform_name in platforms for archive_format in ('tar.gz', 'zip')]
+        assets += [{'name': 'checksums.txt', 'size': 1, 'browser_download_url': 'http://127.0.0.1:9/x'},
+                   {'name': 'tool-v1.0.0-x86_64-unknown-linux-gnu.tar.gz', 'size': 1,
+                    'browser_download_url': 'http://127.0.0.1:9/x'}]
+        results['find_linux_binary_ms'] = median_ms(lambda: github.find_linux_binary(assets, 'tool'), args.repeat)
+
+        binary = make_payload(args.archive_kb * 1024)
+        for archive_format, archive_type in (('tar.gz', 'tar'), ('zip', 'zip')):
+            archive_path = temp_path / f'tool.{archive_format}'
+            archive_path.write_bytes(build_archive('tool', archive_format, binary, args.members))
+            extract_dir = temp_path / f'extract-{archive_type}'
+            key = archive_format.replace('.', '_')
+            results[f'extract_archive_{key}_ms'] = median_ms(
+                lambda: binary_manager.extract_archive(archive_path, archive_type, extract_dir), args.repeat)
+            files = binary_manager.extract_archive(archive_path, archive_type, extract_dir)
+            results[f'find_binary_{key}_ms'] = median_ms(lambda: binary_manager.find_binary(files, 'tool'),
+                                                         args.repeat)
+
+    for name, value in results.items():
+        print(f"{name:<28} {value:9.3f} ms")
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(results_path: Path, params: Dict) -> Optional[Dict]:
+    """Last stored result that used the same parameters"""
+    if not results_path.exists():
+        return None
+    previous = None
+    with open(results_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('params') == params:
+                previous = record
+    return previous
+
+
+def compare(record: Dict, previous: Dict) -> None:
+    print(f"\nCompared with {previous.get('commit') or 'unknown commit'} from {previous['timestamp']}:")
+    old_runs = {(r['programs'], r['run']): r for r in previous['end_to_end']}
+    for result in record['end_to_end']:
+        old = old_runs.get((result['programs'], result['run']))
+        if old and old['seconds']:
+            change = (result['seconds'] - old['seconds']) / old['seconds'] * 100
+            print(f"{result['programs']:>5} programs  {result['run']:<7} {old['seconds'] * 1000:9.1f} -> "
+                  f"{result['seconds'] * 1000:9.1f} ms ({change:+.1f}%)")
+    for name, value in record['components'].items():
+        old_value = previous['components'].get(name)
+        if old_value:
+            print(f"{name:<28} {old_value:9.3f} -> {value:9.3f} ms ({(value - old_value) / old_value * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--programs', default='1,10,50,200',
+                        help='Comma separated program counts to run (default: 1,10,50,200)')
+    parser.add_argument('--archive-kb', type=int, default=512, help='Size of each binary in KiB (default: 512)')
+    parser.add_argument('--members', type=int, default=40, help='Files in each archive (default: 40)')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Delay added to every response (default: 20)')
+    parser.add_argument('--jobs', '-j', type=int, default=4, help='binmgr --jobs (default: 4)')
+    parser.add_argument('--stream', action='store_true', help='Run binmgr with --stream')
+    parser.add_argument('--log-level', default='debug', help='binmgr log_level (default: debug)')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetitions of component timings (default: 20)')
+    parser.add_argument('--output', type=Path, default=DEFAULT_RESULTS,
+                        help=f'JSON lines file results are appended to (default: {DEFAULT_RESULTS})')
+    parser.add_argument('--compare', action='store_true', help='Compare with the last result with the same parameters')
+    args = parser.parse_args()
+
+    os.environ.pop('GITHUB_TOKEN', None)
+    params = {
+        'archive_kb': args.archive_kb, 'members': args.members, 'latency_ms': args.latency_ms, 'jobs': args.jobs,
+        'stream': args.stream, 'log_level': args.log_level,
+        'programs': [int(count) for count in args.programs.split(',')],
+    }
+    previous = load_previous(args.output, params) if args.compare else None
+
+    original_home = os.environ.get('HOME')
+    try:
+        end_to_end = []
+        for program_count in params['programs']:
+            end_to_end += bench_end_to_end(program_count, args)
+        components = bench_components(args)
+    finally:
+        if original_home is not None:
+            os.environ['HOME'] = original_home
+
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'params': params,
+        'end_to_end': end_to_end,
+        'components': components,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    print(f"\nResults appended to {args.output}")
+
+    if previous:
+        compare(record, previous)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Start-up time benchmark for binmgr.
+
+Times `--help` and a no-op run (every program checked within its check interval), using a
+throwaway HOME so nothing on the machine is touched. The no-op run must not import `requests`.
+Exits with status 1 when a median exceeds its limit, so it can gate CI.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --binmgr binmgr/binmgr --max-noop-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+NOOP_PROBE = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+from main import BinMgr
+BinMgr(sys.argv[2]).run()
+print('requests' in sys.modules)
+'''
+
+
+def time_command(command, env, runs):
+    """Median wall time of a command in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def make_noop_home(home, program_count):
+    """Create a config and versions file in which every program was just checked"""
+    bin_dir = home / '.local' / 'bin'
+    bin_dir.mkdir(parents=True)
+    programs = {f'tool{i}': f'example/tool{i}' for i in range(program_count)}
+    config_path = home / 'config.json'
+    config_path.write_text(json.dumps({'programs': programs, 'check_interval': '1d', 'cache_max_mb': 0}))
+    now = time.time()
+    versions = {name: {'version': 'v1.0.0', 'last_checked': now} for name in programs}
+    (bin_dir / 'binmgr_versions.json').write_text(json.dumps(versions))
+    return config_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--binmgr', help='binmgr executable to time (default: src/main.py with this python)')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per measurement (default: 10)')
+    parser.add_argument('--programs', type=int, default=40, help='Programs in the no-op config (default: 40)')
+    parser.add_argument('--max-help-ms', type=float, help='Fail if --help takes longer than this')
+    parser.add_argument('--max-noop-ms', type=float, help='Fail if a no-op run takes longer than this')
+    args = parser.parse_args()
+
+    command = [args.binmgr] if args.binmgr else [sys.executable, str(SRC_DIR / 'main.py')]
+    failures = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        home = Path(temp_dir)
+        env = dict(os.environ, HOME=str(home))
+        env.pop('GITHUB_TOKEN', None)
+        config_path = make_noop_home(home, args.programs)
+
+        help_ms = time_command(command + ['--help'], env, args.runs)
+        noop_ms = time_command(command + ['--config', str(config_path)], env, args.runs)
+
+        probe = subprocess.run([sys.executable, '-c', NOOP_PROBE, str(SRC_DIR), str(config_path)], env=env,
+                               check=True, capture_output=True, text=True)
+        imports_requests = probe.stdout.strip().splitlines()[-1] == 'True'
+
+    print(f"--help:          {help_ms:8.1f} ms (median of {args.runs})")
+    print(f"no-op run:       {noop_ms:8.1f} ms (median of {args.runs}, {args.programs} programs)")
+    print(f"no-op imports requests: {'yes' if imports_requests else 'no'}")
+
+    if args.max_help_ms is not None and help_ms > args.max_help_ms:
+        failures.append(f"--help took {help_ms:.1f} ms, limit is {args.max_help_ms:.1f} ms")
+    if args.max_noop_ms is not None and noop_ms > args.max_noop_ms:
+        failures.append(f"no-op run took {noop_ms:.1f} ms, limit is {args.max_noop_ms:.1f} ms")
+    if imports_requests:
+        failures.append("no-op run imported requests")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the GitHub releases API, used by the benchmarks.
+
+Serves `/repos/<owner>/<repo>/releases/latest` for programs named tool0, tool1, ... and the release assets
+themselves. Each release has a tar.gz or zip archive for Linux x86_64 (alternating between programs) next to
+macOS and Windows decoys. Archives are synthetic: the program binary plus filler members such as man pages and
+shell completions. Responses carry ETags, so unchanged releases are answered with 304, and rate-limit headers.
+Downloads carry an ETag of their contents and support HEAD, Range and If-Range requests, Range support can be
+turned off. Every response can be delayed to simulate latency.
+A minimal `/graphql` endpoint answers binmgr's batched release query, with the first 100 assets per release.
+
+    python benchmarks/fake_github.py --programs 50 --archive-kb 512 --members 40 --latency-ms 20
+"""
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+import zipfile
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+ARCHIVE_FORMATS = ('tar.gz', 'zip')
+DECOY_ASSETS = ('{name}-{tag}-darwin-arm64.tar.gz', '{name}-{tag}-windows-amd64.zip')
+# The binary is half random and half zeros, so it compresses about as well as a real one
+PAYLOAD_SEED = 1234
+GRAPHQL_PAGE_SIZE = 100
+
+
+def make_payload(size: int) -> bytes:
+    rng = random.Random(PAYLOAD_SEED)
+    half = size // 2
+    return rng.getrandbits(half * 8).to_bytes(half, 'little') + bytes(size - half)
+
+
+def build_archive(name: str, archive_format: str, binary: bytes, members: int) -> bytes:
+    """Build an archive holding the program binary and `members - 1` small filler files"""
+    files = [(f'{name}/{name}', binary, 0o755)]
+    for i in range(max(0, members - 1)):
+        if i % 3 == 0:
+            files.append((f'{name}/doc/{name}-{i}.1', f'.TH {name.upper()} 1\n'.encode() * 40, 0o644))
+        elif i % 3 == 1:
+            files.append((f'{name}/complete/{name}-{i}.bash', f'complete -F _{name} {name}\n'.encode() * 20, 0o644))
+        else:
+            files.append((f'{name}/README-{i}.md', f'# {name}\n'.encode() * 60, 0o644))
+
+    buffer = io.BytesIO()
+    if archive_format == 'zip':
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path, data, mode in files:
+                info = zipfile.ZipInfo(path, date_time=(2024, 1, 1, 0, 0, 0))
+                info.external_attr = (0o100000 | mode) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, data)
+    else:
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            for path, data, mode in files:
+                info = tarfile.TarInfo(path)
+                info.size = len(data)
+                info.mode = mode
+                info.mtime = 1704067200
+                archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class FakeGitHub:
+    """A fake GitHub API and asset host on a local port, usable as a context manager"""
+
+    def __init__(self, programs: int, archive_kb: int = 512, members: int = 40, latency_ms: float = 0,
+                 rate_limit: int = 5000, host: str = '127.0.0.1', port: int = 0, extra_assets: int = 0,
+                 ranges: bool = True, digests: bool = False):
+        self.program_names = [f'tool{i}' for i in range(programs)]
+        self.members = members
+        # Additional decoy assets per release, listed before the Linux archive
+        self.extra_assets = extra_assets
+        # Without range support downloads ignore the Range header, like some mirrors and proxies
+        self.ranges = ranges
+        # Publish the SHA-256 of the Linux archive as the asset digest, like GitHub does for newer releases
+        self.digests = digests
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.tag = 'v1.0.0'
+        self.stats: Dict[str, int] = {'releases': 0, 'not_modified': 0, 'graphql_queries': 0, 'downloads': 0,
+                                      'range_requests': 0, 'download_bytes': 0}
+        self._lock = threading.Lock()
+        # Remaining requests and reset time per rate-limit resource, REST and GraphQL are counted apart
+        self._budgets: Dict[str, List[float]] = {}
+        # Archive contents don't depend on the tag, so a new release reuses them
+        binary = make_payload(archive_kb * 1024)
+        self.archives: Dict[str, bytes] = {name: build_archive(name, self.archive_format(name), binary, members)
+                                           for name in self.program_names}
+        self.server = ThreadingHTTPServer((host, port), FakeGitHubHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @staticmethod
+    def archive_format(name: str) -> str:
+        return ARCHIVE_FORMATS[int(name[4:]) % len(ARCHIVE_FORMATS)]
+
+    def asset_name(self, name: str, tag: str) -> str:
+        return f'{name}-{tag}-x86_64-unknown-linux-gnu.{self.archive_format(name)}'
+
+    def asset_url(self, name: str, asset: Optional[str] = None) -> str:
+        """Download URL of a release asset, the program's Linux archive by default"""
+        return f'{self.url}/download/{name}/{self.tag}/{asset or self.asset_name(name, self.tag)}'
+
+    def release(self, name: str) -> Dict:
+        assets = [decoy.format(name=name, tag=self.tag) for decoy in DECOY_ASSETS]
+        assets += [f'{name}-{self.tag}-extra{i}.txt' for i in range(self.extra_assets)]
+        assets.append(self.asset_name(name, self.tag))
+        archive_size = len(self.archives[name])
+        release = {
+            'tag_name': self.tag,
+            'html_url': f'{self.url}/bench/{name}/releases/tag/{self.tag}',
+            'published_at': '2024-01-01T00:00:00Z',
+            'body': '',
+            'assets': [{'name': asset, 'size': archive_size,
+                        'browser_download_url': self.asset_url(name, asset)}
+                       for asset in assets],
+        }
+        if self.digests:
+            release['assets'][-1]['digest'] = f'sha256:{hashlib.sha256(self.archives[name]).hexdigest()}'
+        return release
+
+    def asset(self, name: str) -> Optional[bytes]:
+        """Archive bytes behind a program's asset URLs, decoys are served with the Linux archive's contents"""
+        return self.archives.get(name)
+
+    def spend_rate_limit(self, resource: str = 'core') -> Dict[str, str]:
+        """Count an API request against the rate limit of a resource, returns the rate-limit headers"""
+        with self._lock:
+            budget = self._budgets.get(resource)
+            if budget is None or time.time() >= budget[1]:
+                budget = self._budgets[resource] = [self.rate_limit, time.time() + 3600]
+            budget[0] = max(0, budget[0] - 1)
+            return {'X-RateLimit-Limit': str(self.rate_limit), 'X-RateLimit-Remaining': str(int(budget[0])),
+                    'X-RateLimit-Reset': str(int(budget[1])), 'X-RateLimit-Resource': resource}
+
+    def count(self, stat: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[stat] += amount
+
+    def start(self) -> 'FakeGitHub':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'FakeGitHub':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: ThreadingHTTPServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_POST(self):
+        fake: FakeGitHub = self.server.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/graphql' or not self.headers.get('Authorization'):
+            self._send_empty(HTTPStatus.NOT_FOUND if self.path != '/graphql' else HTTPStatus.UNAUTHORIZED)
+            return
+
+        # Answer every rN: repository(owner: $oN, name: $nN) alias of binmgr's query
+        variables = json.loads(body).get('variables') or {}
+        data = {}
+        for key, owner in variables.items():
+            if not key.startswith('o'):
+                continue
+            index = key[1:]
+            name = variables.get(f'n{index}')
+            data[f'r{index}'] = self._graphql_repository(fake, name) if name in fake.program_names else None
+
+        fake.count('graphql_queries')
+        payload = json.dumps({'data': data}).encode()
+        self.send_response(HTTPStatus.OK)
+        for header, value in fake.spend_rate_limit('graphql').items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @staticmethod
+    def _graphql_repository(fake: 'FakeGitHub', name: str) -> Dict:
+        release = fake.release(name)
+        return {'latestRelease': {
+            'tagName': release['tag_name'],
+            'url': release['html_url'],
+            'publishedAt': release['published_at'],
+            'description': release['body'],
+            'releaseAssets': {
+                'nodes': [{'name': asset['name'], 'downloadUrl': asset['browser_download_url'], 'size': asset['size']}
+                          for asset in release['assets'][:GRAPHQL_PAGE_SIZE]],
+                'pageInfo': {'hasNextPage': len(release['assets']) > GRAPHQL_PAGE_SIZE},
+            },
+        }}
+
+    def _handle(self, send_body: bool):
+        fake: FakeGitHub = self.server.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        release_match = re.fullmatch(r'/repos/[^/]+/([^/]+)/releases/latest', self.path)
+        if release_match:
+            self._send_release(fake, release_match.group(1), send_body)
+            return
+
+        download_match = re.fullmatch(r'/download/([^/]+)/[^/]+/[^/]+', self.path)
+        data = fake.asset(download_match.group(1)) if download_match else None
+        if data is None:
+            self._send_empty(HTTPStatus.NOT_FOUND)
+            return
+        self._send_asset(fake, data, send_body)
+
+    def _send_release(self, fake: FakeGitHub, name: str, send_body: bool):
+        rate_headers = fake.spend_rate_limit()
+        if name not in fake.program_names:
+            self._send_empty(HTTPStatus.NOT_FOUND, rate_headers)
+            return
+
+        etag = f'"{name}-{fake.tag}"'
+        if self.headers.get('If-None-Match') == etag:
+            fake.count('not_modified')
+            self._send_empty(HTTPStatus.NOT_MODIFIED, dict(rate_headers, ETag=etag))
+            return
+
+        fake.count('releases')
+        body = json.dumps(fake.release(name)).encode()
+        self.send_response(HTTPStatus.OK)
+        for header, value in rate_headers.items():
+            self.send_header(header, value)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_asset(self, fake: FakeGitHub, data: bytes, send_body: bool):
+        start, end = 0, len(data) - 1
+        etag = f'"{hashlib.sha1(data).hexdigest()[:16]}"'
+        range_match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        # A Range with an If-Range that no longer matches gets the whole file
+        if_range = self.headers.get('If-Range')
+        if (fake.ranges and range_match and (range_match.group(1) or range_match.group(2))
+                and if_range in (None, etag)):
+            if range_match.group(1):
+                start = int(range_match.group(1))
+                end = min(int(range_match.group(2)), end) if range_match.group(2) else end
+            else:
+                start = max(0, len(data) - int(range_match.group(2)))
+            fake.count('range_requests')
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(HTTPStatus.OK)
+
+        self.send_header('Accept-Ranges', 'bytes' if fake.ranges else 'none')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if send_body:
+            fake.count('downloads')
+            fake.count('download_bytes', end - start + 1)
+            self.wfile.write(data[start:end + 1])
+
+    def _send_empty(self, status: HTTPStatus, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--programs', type=int, default=10, help='Number of fake programs (default: 10)')
+    parser.add_argument('--archive-kb', type=int, default=512, help='Size of each binary in KiB (default: 512)')
+    parser.add_argument('--members', type=int, default=40, help='Files in each archive (default: 40)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response (default: 0)')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='API requests allowed per hour (default: 5000)')
+    parser.add_argument('--port', type=int, default=8766, help='Port to listen on (default: 8766)')
+    args = parser.parse_args()
+
+    fake = FakeGitHub(args.programs, args.archive_kb, args.members, args.latency_ms, args.rate_limit, port=args.port)
+    print(f"Serving {args.programs} fake programs on {fake.url}, use it as api_url")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,78 +1,196 @@
+import hashlib
 import os
-import tarfile
-import zipfile
+import shutil
 import stat
-from pathlib import Path
-from typing import Optional, List
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Optional, List, Tuple
 from logger import Logger
 
+# tarfile, zipfile, gzip and zstandard are imported where archives are opened to keep start-up fast
+# zstandard is optional, it is only needed for .tar.zst archives
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
 
 class BinaryManager:
-    def __init__(self, bin_dir: Path, temp_dir: Path, logger: Logger):
+    def __init__(self, bin_dir: Path, temp_dir: Path, logger: Logger, store_dir: Optional[Path] = None):
         self.bin_dir = bin_dir
         self.temp_dir = temp_dir
+        self.store_dir = store_dir or bin_dir / '.binmgr_store'
         self.logger = logger
 
     def find_binary(self, files: List[Path], program_name: str) -> Optional[Path]:
         """Find the most probable binary file from extracted files."""
-        self.logger.debug(f"Searching for binary '{program_name}' among {len(files)} files", program_name)
+        self.logger.debug("Searching for binary '%s' among %d files", program_name, len(files), program=program_name)
         candidates = []
+        debug = self.logger.debug_enabled
 
         for file_path in files:
-            self.logger.debug(f"Examining file: {file_path}", program_name)
+            self.logger.debug("Examining file: %s", file_path, program=program_name)
 
             if not file_path.is_file():
-                self.logger.debug(f"Skipping {file_path} (not a file)", program_name)
+                self.logger.debug("Skipping %s (not a file)", file_path, program=program_name)
                 continue
 
             # Log file permissions
-            perms = oct(file_path.stat().st_mode)[-3:]
-            self.logger.debug(f"File permissions for {file_path}: {perms}", program_name)
-
-            # Consider file executable if it has any execute bits set or if it's named exactly as program
-            is_executable = os.access(file_path, os.X_OK) or file_path.name == program_name
-            if is_executable:
-                self.logger.debug(f"Found executable file: {file_path}", program_name)
-                # for exact match or program name match
-                if (file_path.name == program_name or
-                        program_name.lower() in file_path.name.lower()):
-                    self.logger.debug(f"Adding candidate (name match): {file_path}", program_name)
-                    candidates.append(file_path)
-                # for nested binaries
-                elif file_path.parent.name.startswith(program_name):
-                    self.logger.debug(f"Adding candidate (parent dir match): {file_path}", program_name)
-                    candidates.append(file_path)
+            if debug:
+                perms = oct(file_path.stat().st_mode)[-3:]
+                self.logger.debug("File permissions for %s: %s", file_path, perms, program=program_name)
+
+            reason = self._candidate_reason(file_path.name, file_path.parent.name,
+                                            os.access(file_path, os.X_OK), program_name)
+            if reason:
+                self.logger.debug("Adding candidate (%s): %s", reason, file_path, program=program_name)
+                candidates.append(file_path)
             else:
-                self.logger.debug(f"File not executable: {file_path}", program_name)
+                self.logger.debug("Not a candidate: %s", file_path, program=program_name)
 
+        return self._select_candidate(candidates, program_name)
+
+    @staticmethod
+    def _candidate_reason(name: str, parent_name: str, has_exec_bit: bool, program_name: str) -> Optional[str]:
+        """Return why a file could be the program binary, or None if it can't"""
+        # Consider file executable if it has any execute bits set or if it's named exactly as program
+        if not (has_exec_bit or name == program_name):
+            return None
+        # for exact match or program name match
+        if name == program_name or program_name.lower() in name.lower():
+            return 'name match'
+        # for nested binaries
+        if parent_name.startswith(program_name):
+            return 'parent dir match'
+        return None
+
+    def _select_candidate(self, candidates: List[Path], program_name: str) -> Optional[Path]:
+        """Pick the best binary among candidate files"""
         if not candidates:
-            self.logger.debug("No candidates found", program_name)
+            self.logger.debug("No candidates found", program=program_name)
             return None
 
         # Prefer exact name match
         exact_matches = [c for c in candidates if c.name == program_name]
         if exact_matches:
-            self.logger.debug(f"Found exact match: {exact_matches[0]}", program_name)
+            self.logger.debug("Found exact match: %s", exact_matches[0], program=program_name)
             return exact_matches[0]
 
         # Then prefer the shortest name (this should hopefully be the proper binary)
         selected = min(candidates, key=lambda x: len(x.name))
-        self.logger.debug(f"Selected shortest name: {selected}", program_name)
+        self.logger.debug("Selected shortest name: %s", selected, program=program_name)
         return selected
 
-    def extract_archive(self, archive_path: Path, archive_type: str) -> List[Path]:
-        """Extract archive"""
-        extract_dir = self.temp_dir / archive_path.stem
-        extract_dir.mkdir(exist_ok=True)
+    def stream_extract_tar(self, stream: BinaryIO, dest_dir: Path, program_name: str,
+                           archive_type: str = 'tar') -> Optional[Path]:
+        """
+        Extract the program binary from a tar stream without unpacking the archive.
+        Members are matched on their headers as they arrive, only candidates are written.
+        """
+        # Candidates of an earlier attempt would collide with this one's
+        shutil.rmtree(dest_dir, ignore_errors=True)
+        dest_dir.mkdir(parents=True)
+        candidates = []
+        member_count = 0
+
+        import tarfile
+        if archive_type == 'tar.zst':
+            stream = self._open_zstd(stream)
+        with tarfile.open(fileobj=stream, mode='r|*') as tar_archive:
+            for member in tar_archive:
+                member_count += 1
+                if not member.isfile():
+                    continue
+
+                member_path = PurePosixPath(member.name)
+                reason = self._candidate_reason(member_path.name, member_path.parent.name,
+                                                bool(member.mode & 0o111), program_name)
+                if not reason:
+                    continue
+
+                # Member names never reach the filesystem, so there is no path traversal to guard against
+                target = dest_dir / str(len(candidates)) / member_path.name
+                target.parent.mkdir()
+                source = tar_archive.extractfile(member)
+                with open(target, 'wb') as f:
+                    shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+                target.chmod(member.mode & 0o777)
+                self.logger.debug("Adding candidate (%s): %s", reason, member.name, program=program_name)
+                candidates.append(target)
+
+        self.logger.debug("Streamed %d archive members, kept %d", member_count, len(candidates), program=program_name)
+        return self._select_candidate(candidates, program_name)
+
+    def extract_zip_member(self, zip_file: BinaryIO, dest_dir: Path, program_name: str) -> Optional[Path]:
+        """
+        Extract only the program binary from a zip file.
+        The binary is chosen from the central directory, so only its data is read.
+        """
+        dest_dir.mkdir(parents=True, exist_ok=True)
+
+        import zipfile
+        with zipfile.ZipFile(zip_file) as zip_ref:
+            members = {}
+            for info in zip_ref.infolist():
+                if info.is_dir():
+                    continue
+                member_path = PurePosixPath(info.filename)
+                reason = self._candidate_reason(member_path.name, member_path.parent.name,
+                                                bool((info.external_attr >> 16) & 0o111), program_name)
+                if reason:
+                    self.logger.debug("Adding candidate (%s): %s", reason, info.filename, program=program_name)
+                    members[member_path] = info
+
+            selected = self._select_candidate(list(members), program_name)
+            if not selected:
+                return None
+
+            info = members[selected]
+            target = dest_dir / selected.name
+            with zip_ref.open(info) as source, open(target, 'wb') as f:
+                shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+
+        target.chmod(((info.external_attr >> 16) & 0o777) or 0o755)
+        return target
+
+    def extract_archive(self, archive_path: Path, archive_type: str, extract_dir: Optional[Path] = None,
+                        program_name: Optional[str] = None) -> List[Path]:
+        """
+        Extract archive, next to the downloaded file unless `extract_dir` is given.
+        Single-file formats are written as `program_name`, or the archive's name without its suffix.
+        """
+        if extract_dir is None:
+            extract_dir = archive_path.parent / archive_path.stem
+        extract_dir.mkdir(parents=True, exist_ok=True)
 
         if archive_type == 'tar':
             return self._extract_tar(archive_path, extract_dir)
+        elif archive_type == 'tar.zst':
+            return self._extract_tar_zst(archive_path, extract_dir)
         elif archive_type == 'zip':
             return self._extract_zip(archive_path, extract_dir)
+        elif archive_type in ('gz', 'binary'):
+            target = extract_dir / (program_name or archive_path.name.removesuffix('.gz'))
+            if archive_type == 'gz':
+                import gzip
+                with gzip.open(archive_path) as source, open(target, 'wb') as f:
+                    shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+            else:
+                # Copied rather than moved, the download may be a cache object
+                shutil.copyfile(archive_path, target)
+            target.chmod(0o755)
+            return [target]
         raise ValueError(f"Unsupported archive type: {archive_type}")
 
+    @staticmethod
+    def _open_zstd(stream: BinaryIO) -> BinaryIO:
+        """Wrap a stream of zstd-compressed data in a reader of the decompressed data"""
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("The zstandard package is needed for .tar.zst archives") from None
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+
     @staticmethod
     def _extract_tar(archive_path: Path, extract_dir: Path) -> List[Path]:
+        import tarfile
         with tarfile.open(archive_path) as tar_archive:
             def is_within_directory(directory: Path, target: Path):
                 abs_directory = directory.resolve()
@@ -91,21 +209,119 @@ class BinaryManager:
 
         return list(extract_dir.rglob('*'))
 
+    @classmethod
+    def _extract_tar_zst(cls, archive_path: Path, extract_dir: Path) -> List[Path]:
+        """Extract a zstd-compressed tar archive, which can only be read front to back"""
+        import tarfile
+        root = extract_dir.resolve()
+        with open(archive_path, 'rb') as f, cls._open_zstd(f) as reader, \
+                tarfile.open(fileobj=reader, mode='r|') as tar_archive:
+            for member in tar_archive:
+                target = (extract_dir / member.name).resolve()
+                if os.path.commonpath([root, target]) != str(root):
+                    raise Exception("Attempted path traversal in tar file")
+                tar_archive.extract(member, extract_dir)
+
+        return list(extract_dir.rglob('*'))
+
     @staticmethod
     def _extract_zip(archive_path: Path, extract_dir: Path) -> List[Path]:
+        import zipfile
         with zipfile.ZipFile(archive_path) as zip_ref:
             zip_ref.extractall(path=extract_dir)
 
         return list(extract_dir.rglob('*'))
 
-    def install_binary(self, binary_path: Path, program_name: str) -> None:
-        """Install binary to bin (~/.local/bin/)"""
+    def install_binary(self, binary_path: Path, program_name: str, version: str,
+                       installed_sha256: Optional[str] = None,
+                       binary_sha256: Optional[str] = None) -> Tuple[str, Path]:
+        """
+        Install binary into the version store and point bin (~/.local/bin/) at it.
+        `installed_sha256` is the recorded digest of the installed binary, which is only hashed when there is none.
+        `binary_sha256` is the digest of `binary_path` if already known, like a raw binary hashed while downloading.
+        Returns the binary's SHA-256 and the path it is stored at.
+        """
+        dest_path = self.bin_dir / program_name
+        sha256 = binary_sha256 or self.file_sha256(binary_path)
+
+        # Leave an identical binary alone, unless it still needs moving into the store
+        if (dest_path.is_file() and dest_path.resolve().is_relative_to(self.store_dir.resolve())
+                and dest_path.stat().st_size == binary_path.stat().st_size
+                and (installed_sha256 or self.file_sha256(dest_path)) == sha256):
+            self.logger.debug("Installed binary at %s is identical, skipping install", dest_path, program=program_name)
+            return sha256, dest_path.resolve()
+
+        store_path = self.store_path(program_name, version)
+        store_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Stage next to the destination so the final rename is atomic
+        staged_path = store_path.with_name(f'.{program_name}.binmgr-new')
+        try:
+            self._stage_file(binary_path, staged_path)
+            # Ensure the binary is executable before anything can run it
+            staged_path.chmod(staged_path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+            os.replace(staged_path, store_path)
+        except BaseException:
+            staged_path.unlink(missing_ok=True)
+            raise
+
+        self.activate(store_path, program_name)
+        if self.logger.debug_enabled:
+            self.logger.debug("Installed binary to %s with permissions: %s", store_path,
+                              oct(store_path.stat().st_mode)[-3:], program=program_name)
+        return sha256, store_path
+
+    def store_path(self, program_name: str, version: str) -> Path:
+        """Location of a program version in the store"""
+        return self.store_dir / program_name / version.replace('/', '_') / program_name
+
+    def activate(self, store_path: Path, program_name: str) -> None:
+        """Atomically point bin/<program_name> at a stored binary"""
         dest_path = self.bin_dir / program_name
+        link_path = self.bin_dir / f'.{program_name}.binmgr-link'
+        link_path.unlink(missing_ok=True)
+        link_path.symlink_to(os.path.relpath(store_path, self.bin_dir))
+        try:
+            os.replace(link_path, dest_path)
+        except BaseException:
+            link_path.unlink(missing_ok=True)
+            raise
+
+    def remove_stored(self, store_path: Path, program_name: str) -> None:
+        """Remove a version from the store"""
+        if store_path.parent.parent.parent != self.store_dir:
+            return
+        shutil.rmtree(store_path.parent, ignore_errors=True)
+        self.logger.debug("Removed old version %s", store_path.parent.name, program=program_name)
 
-        # Copy binary and set permissions
-        import shutil
-        shutil.copy2(binary_path, dest_path)
-        # Ensure the binary is executable
-        dest_path.chmod(dest_path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
-        self.logger.debug(f"Installed binary to {dest_path} with permissions: {oct(dest_path.stat().st_mode)[-3:]}",
-                          program_name)
+    @staticmethod
+    def _stage_file(source: Path, staged_path: Path) -> None:
+        """Move a file into place, copying in the kernel only when it is on another filesystem"""
+        try:
+            os.rename(source, staged_path)
+            return
+        except OSError:
+            pass
+
+        with open(source, 'rb') as fsrc, open(staged_path, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        # Some filesystems report nothing copied instead of refusing
+                        raise OSError(f"copy_file_range stopped with {remaining} bytes left")
+                    remaining -= copied
+            except (AttributeError, OSError):
+                # copy_file_range is unavailable, refused or stopped short, copyfile falls back to sendfile
+                fdst.close()
+                shutil.copyfile(source, staged_path)
+        shutil.copymode(source, staged_path)
+
+    @staticmethod
+    def file_sha256(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
@@ -3,14 +3,32 @@ import json
 from pathlib import Path
 from typing import Dict, Optional
 
+from logger import DEFAULT_LOG_LEVEL, LOG_LEVELS
+
+DEFAULT_API_URL = 'https://api.github.com'
+DEFAULT_CACHE_MAX_MB = 1024
+DEFAULT_DOWNLOAD_CONNECTIONS = 4
+DEFAULT_KEEP_VERSIONS = 3
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_RATE_LIMIT_MAX_WAIT = 300
+DEFAULT_RETRY_FAILED = 1
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
 
 class ConfigManager:
-    def __init__(self, config_path: Optional[str] = None):
-        self.config_path = self._find_config(config_path)
-        self.config_data = self._load_config()
+    def __init__(self, config_path: Optional[str] = None, required: bool = True):
+        try:
+            self.config_path: Optional[Path] = self._find_config(config_path)
+        except FileNotFoundError:
+            if required:
+                raise
+            self.config_path = None
+        self.config_data = self._load_config() if self.config_path else {}
         self.bin_dir = Path.home() / '.local' / 'bin'
         self.temp_dir = self.bin_dir / '.binmgr_temp'
+        self.store_dir = self.bin_dir / '.binmgr_store'
         self.version_file = self.bin_dir / 'binmgr_versions.json'
+        self.release_cache_file = self.bin_dir / 'binmgr_release_cache.json'
 
     @staticmethod
     def _find_config(provided_path: Optional[str]) -> Path:
@@ -40,8 +58,76 @@ class ConfigManager:
         with open(self.config_path) as f:
             return json.load(f)
 
-    def get_programs(self):
-        return self.config_data.get('programs', {})
+    def get_programs(self) -> Dict[str, str]:
+        """Get programs as {name: repo}, entries may be a repo or a {"repo": ...} object"""
+        return {name: entry['repo'] if isinstance(entry, dict) else entry
+                for name, entry in self.config_data.get('programs', {}).items()}
+
+    def get_check_interval(self, program: str) -> Optional[float]:
+        """Seconds between update checks for a program, None to check on every run"""
+        entry = self.config_data.get('programs', {}).get(program)
+        if isinstance(entry, dict) and 'check_interval' in entry:
+            return self._parse_interval(entry['check_interval'])
+        return self._parse_interval(self.config_data.get('check_interval'))
+
+    @staticmethod
+    def _parse_interval(value) -> Optional[float]:
+        """Parse seconds given as a number or a string like '90s', '30m', '12h' or '7d'"""
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        value = str(value).strip().lower()
+        if value and value[-1] in INTERVAL_UNITS:
+            return float(value[:-1]) * INTERVAL_UNITS[value[-1]]
+        return float(value)
+
+    def get_api_url(self) -> str:
+        return self.config_data.get('api_url', DEFAULT_API_URL).rstrip('/')
+
+    def get_cache_dir(self) -> Path:
+        cache_dir = self.config_data.get('cache_dir')
+        if cache_dir:
+            return Path(cache_dir).expanduser()
+        return Path.home() / '.cache' / 'binmgr'
+
+    def get_cache_max_bytes(self) -> int:
+        return int(self.config_data.get('cache_max_mb', DEFAULT_CACHE_MAX_MB)) * 1024 * 1024
+
+    def get_download_connections(self) -> int:
+        return int(self.config_data.get('download_connections', DEFAULT_DOWNLOAD_CONNECTIONS))
+
+    def get_keep_versions(self) -> int:
+        return max(1, int(self.config_data.get('keep_versions', DEFAULT_KEEP_VERSIONS)))
+
+    def get_version_flush_interval(self) -> Optional[float]:
+        interval = self.config_data.get('version_flush_interval')
+        return float(interval) if interval is not None else None
+
+    def get_max_retries(self) -> int:
+        return int(self.config_data.get('max_retries', DEFAULT_MAX_RETRIES))
+
+    def get_rate_limit_max_wait(self) -> float:
+        return float(self.config_data.get('rate_limit_max_wait', DEFAULT_RATE_LIMIT_MAX_WAIT))
+
+    def get_retry_failed(self) -> int:
+        return int(self.config_data.get('retry_failed', DEFAULT_RETRY_FAILED))
+
+    def get_stream_extract(self) -> bool:
+        return bool(self.config_data.get('stream_extract', False))
+
+    def get_log_level(self) -> str:
+        level = str(self.config_data.get('log_level', DEFAULT_LOG_LEVEL)).lower()
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Invalid log_level '{level}', expected one of: {', '.join(LOG_LEVELS)}")
+        return level
+
+    def get_mirror_url(self) -> Optional[str]:
+        mirror_url = self.config_data.get('mirror_url')
+        return mirror_url.rstrip('/') if mirror_url else None
+
+    def get_github_token(self) -> Optional[str]:
+        return os.getenv('GITHUB_TOKEN') or self.config_data.get('github_token')
 
     def ensure_directories(self):
         """Verify directories exist."""
@@ -0,0 +1,181 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+# Directories are group-writable with the setgid bit, so users of a shared cache in one group can all write to it
+SHARED_DIR_MODE = 0o2775
+SHARED_FILE_MODE = 0o664
+
+
+class DownloadCache:
+    """
+    Content-addressed store of downloaded assets.
+    Objects are stored by SHA-256 and indexed by the URL they were downloaded from;
+    the least recently used objects are evicted once the cache grows past `max_bytes`.
+    A cache the current user can't write to behaves as a cache that never hits.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = cache_dir / 'objects'
+        self.partial_dir = cache_dir / 'partial'
+        self.index_file = cache_dir / 'index.json'
+        self._lock = threading.Lock()
+
+    def ensure_directories(self):
+        """Verify cache directories exist."""
+        for directory in (self.cache_dir, self.objects_dir, self.partial_dir):
+            self._make_shared_dir(directory)
+
+    @staticmethod
+    def _make_shared_dir(directory: Path):
+        """Create a cache directory writable by the group, directories made by someone else are left alone"""
+        try:
+            directory.mkdir(parents=True)
+        except FileExistsError:
+            return
+        # mkdir's mode is masked by the umask
+        directory.chmod(SHARED_DIR_MODE)
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def partial_path(self, url: str) -> Path:
+        """
+        Download location for an asset before it is added to the cache.
+        Partial downloads are kept per user, another user can't resume into them.
+        """
+        user_dir = self.partial_dir / str(os.getuid())
+        if not user_dir.is_dir():
+            self._make_shared_dir(self.partial_dir)
+            user_dir.mkdir(exist_ok=True)
+        return user_dir / self.digest(url.encode())
+
+    @contextmanager
+    def claim(self, url: str) -> Iterator[None]:
+        """
+        Hold the download of an asset, shared with other threads and binmgr processes.
+        A second download of the same URL waits here and can then find the asset in the cache.
+        """
+        self._make_shared_dir(self.partial_dir)
+        # URLs share 256 lock files, so only the occasional unrelated download waits
+        lock_path = self.partial_dir / f'{self.digest(url.encode())[:2]}.lock'
+        # flock works on a read-only descriptor, so lock files created by another user can be used too
+        lock_fd = os.open(lock_path, os.O_RDONLY | os.O_CREAT, SHARED_FILE_MODE)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(lock_fd)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def lookup(self, url: str, sha256: Optional[str] = None) -> Optional[Path]:
+        """Find a cached asset by digest, or by URL when the digest isn't known"""
+        try:
+            return self._lookup(url, sha256)
+        except OSError:
+            return None
+
+    def _lookup(self, url: str, sha256: Optional[str]) -> Optional[Path]:
+        with self._locked_index() as index:
+            digest = sha256 or index['urls'].get(url)
+            if not digest or digest not in index['objects']:
+                return None
+
+            path = self.object_path(digest)
+            if not path.is_file() or path.stat().st_size != index['objects'][digest]['size']:
+                del index['objects'][digest]
+                return None
+
+            index['objects'][digest]['last_used'] = time.time()
+            index['urls'][url] = digest
+            self._evict(index, keep=digest)
+            return path
+
+    def snapshot(self) -> Dict:
+        """Get the current index without touching any entry"""
+        with self._locked_index(save=False) as index:
+            return index
+
+    def store(self, url: str, source_path: Path, sha256: str) -> Path:
+        """
+        Move a downloaded file into the cache and return its cached path.
+        The file stays where it is when the cache can't be written to.
+        """
+        path = self.object_path(sha256)
+        try:
+            self._make_shared_dir(path.parent)
+            os.replace(source_path, path)
+        except OSError:
+            return source_path
+
+        try:
+            with self._locked_index() as index:
+                index['urls'][url] = sha256
+                index['objects'][sha256] = {'size': path.stat().st_size, 'last_used': time.time()}
+                self._evict(index, keep=sha256)
+        except OSError:
+            # The asset is still usable for this run, later runs download it again
+            pass
+        return path
+
+    def _evict(self, index: Dict, keep: str):
+        """Remove least recently used objects until the cache fits its size cap"""
+        objects = index['objects']
+        total = sum(entry['size'] for entry in objects.values())
+        for digest in sorted(objects, key=lambda d: objects[d]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            try:
+                self.object_path(digest).unlink(missing_ok=True)
+            except OSError:
+                continue
+            total -= objects[digest]['size']
+            del objects[digest]
+
+        index['urls'] = {url: digest for url, digest in index['urls'].items() if digest in objects}
+
+    @contextmanager
+    def _locked_index(self, save: bool = True):
+        """Load the index under a lock shared with other binmgr processes and save it afterwards"""
+        with self._lock:
+            self._make_shared_dir(self.cache_dir)
+            lock_fd = os.open(self.cache_dir / 'index.lock', os.O_RDONLY | os.O_CREAT, SHARED_FILE_MODE)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                index = self._load_index()
+                yield index
+                if not save:
+                    return
+                temp_file = self.index_file.with_name(f'index.json.{os.getpid()}')
+                with open(temp_file, 'w') as f:
+                    # jetbrains bug requires `# type: ignore` (https://youtrack.jetbrains.com/issue/PY-76945)
+                    json.dump(index, f)  # type: ignore
+                os.chmod(temp_file, SHARED_FILE_MODE)
+                os.replace(temp_file, self.index_file)
+            finally:
+                os.close(lock_fd)
+
+    def _load_index(self) -> Dict:
+        if self.index_file.exists():
+            try:
+                with open(self.index_file) as f:
+                    index = json.load(f)
+                index.setdefault('urls', {})
+                index.setdefault('objects', {})
+                return index
+            except (OSError, ValueError):
+                pass
+        return {'urls': {}, 'objects': {}}
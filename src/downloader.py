@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# Assets smaller than this are fetched over a single connection
+PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+STATE_SAVE_INTERVAL = 1.0
+
+
+class HashingReader:
+    """File-like wrapper that computes the SHA-256 of everything read through it"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._digest.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def finish(self) -> str:
+        """Read whatever the consumer left unread and return the digest of the whole stream"""
+        while self.read(DOWNLOAD_BUFFER_SIZE):
+            pass
+        return self._digest.hexdigest()
+
+
+class AssetChanged(IOError):
+    """Raised when the server answers a ranged request with the whole file, because it changed"""
+
+
+class ChunkedDownloader:
+    """
+    Downloads files over parallel byte ranges when the server allows it.
+    Progress is kept in a `.state` file next to the destination, so a download
+    interrupted by a failed or killed run resumes where it stopped. The state holds the
+    file's ETag or Last-Modified, and ranges are requested with `If-Range`, so bytes of
+    a file that was replaced in the meantime are never mixed with the new ones.
+    """
+
+    def __init__(self, session: requests.Session, logger, connections: int = 4):
+        self.session = session
+        self.connections = max(1, connections)
+        self._logger = logger
+
+    def download(self, url: str, dest_path: Path, program_name: Optional[str] = None) -> str:
+        """Download `url` to `dest_path`, returns the SHA-256 of the file"""
+        start_time = time.monotonic()
+        try:
+            sha256, fetched = self._download(url, dest_path, program_name)
+        except AssetChanged:
+            # Whatever was fetched belongs to the old file, the new one is downloaded from the start
+            self._logger.debug("%s changed since the download started, starting over", url, program=program_name)
+            self.discard(dest_path)
+            sha256, fetched = self._download(url, dest_path, program_name)
+
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        self._logger.info(f"Downloaded {fetched / 1e6:.1f} MB in {elapsed:.2f}s "
+                          f"({fetched / 1e6 / elapsed:.1f} MB/s)", program=program_name, file_only=True)
+        return sha256
+
+    def _download(self, url: str, dest_path: Path, program_name: Optional[str]) -> Tuple[str, int]:
+        """Download over byte ranges if the server allows it, returns the SHA-256 and the bytes fetched"""
+        size, accepts_ranges, validator = self._probe(url)
+        if size and accepts_ranges:
+            return self._download_ranges(url, dest_path, size, validator, program_name)
+        return self._download_stream(url, dest_path)
+
+    def _probe(self, url: str) -> Tuple[Optional[int], bool, Optional[str]]:
+        """
+        Get the download size, whether the server accepts Range requests and a validator for `If-Range`:
+        the ETag unless it is weak, which `If-Range` doesn't allow, or else the Last-Modified date.
+        """
+        response = self.session.head(url, allow_redirects=True)
+        if not response.ok:
+            return None, False, None
+        length = response.headers.get('Content-Length')
+        accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        etag = response.headers.get('ETag')
+        validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+        return (int(length) if length and length.isdigit() else None), accepts_ranges, validator
+
+    def _download_stream(self, url: str, dest_path: Path) -> Tuple[str, int]:
+        """Download over one connection without resume support"""
+        response = self.session.get(url, stream=True)
+        response.raise_for_status()
+
+        digest = hashlib.sha256()
+        fetched = 0
+        with response, open(dest_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+                fetched += len(chunk)
+        return digest.hexdigest(), fetched
+
+    def _download_ranges(self, url: str, dest_path: Path, size: int, validator: Optional[str],
+                         program_name: Optional[str]) -> Tuple[str, int]:
+        """Download byte ranges in parallel into a preallocated file, resuming earlier progress of the same file"""
+        state_path = dest_path.with_name(dest_path.name + '.state')
+        parts = self._load_parts(state_path, url, size, validator) if dest_path.exists() else None
+        if parts is None:
+            part_count = self.connections if size >= PARALLEL_MIN_SIZE else 1
+            parts = self._split(size, part_count)
+            with open(dest_path, 'wb') as f:
+                f.truncate(size)
+        else:
+            self._logger.debug("Resuming download at %d of %d bytes", sum(p['next'] - p['start'] for p in parts),
+                               size, program=program_name)
+
+        already_fetched = sum(p['next'] - p['start'] for p in parts)
+        pending = [p for p in parts if p['next'] <= p['end']]
+        digest = hashlib.sha256()
+        # Only bytes restored from an earlier run are read back up front
+        hashed = self._hash_written(dest_path, parts, digest, 0) if already_fetched else 0
+        # The part continuing the hashed prefix is hashed as it arrives, parts after it are read back at the end
+        inline_part = next((p for p in pending if p['next'] == hashed), None)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(pending))) as executor:
+            futures = [executor.submit(self._fetch_part, url, dest_path, part, validator,
+                                       digest if part is inline_part else None)
+                       for part in pending]
+            try:
+                while True:
+                    done, not_done = wait(futures, timeout=STATE_SAVE_INTERVAL, return_when=FIRST_EXCEPTION)
+                    self._save_parts(state_path, url, size, validator, parts)
+                    for future in done:
+                        future.result()
+                    if not not_done:
+                        break
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                self._save_parts(state_path, url, size, validator, parts)
+
+        if inline_part:
+            hashed = inline_part['next']
+        hashed = self._hash_written(dest_path, parts, digest, hashed)
+        if hashed != size:
+            raise IOError(f"Incomplete download of {url}: {hashed} of {size} bytes")
+        state_path.unlink(missing_ok=True)
+        return digest.hexdigest(), size - already_fetched
+
+    def _fetch_part(self, url: str, dest_path: Path, part: Dict, validator: Optional[str] = None,
+                    digest=None) -> None:
+        """
+        Fetch one byte range, advancing `part['next']` only after the bytes are written.
+        The bytes are also fed to `digest` if given, for the part that continues the hashed prefix.
+        """
+        headers = {'Range': f"bytes={part['next']}-{part['end']}"}
+        if validator:
+            headers['If-Range'] = validator
+        with self.session.get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                if validator:
+                    raise AssetChanged(f"{url} changed during the download")
+                raise IOError(f"Server ignored Range request for {url}")
+
+            # Unbuffered, so the recorded progress never runs ahead of the file
+            with open(dest_path, 'r+b', buffering=0) as f:
+                f.seek(part['next'])
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE):
+                    chunk = chunk[:part['end'] + 1 - part['next']]
+                    if digest is not None:
+                        digest.update(chunk)
+                    view = memoryview(chunk)
+                    while view:
+                        written = f.write(view)
+                        view = view[written:]
+                    part['next'] += len(chunk)
+
+        if part['next'] <= part['end']:
+            raise IOError(f"Connection closed early while downloading {url}")
+
+    @staticmethod
+    def _hash_written(dest_path: Path, parts: List[Dict], digest, hashed: int) -> int:
+        """Feed the contiguous written prefix of the file into the digest, returns the new hashed offset"""
+        with open(dest_path, 'rb') as f:
+            for part in parts:
+                if hashed > part['end']:
+                    continue
+                f.seek(hashed)
+                while hashed < part['next']:
+                    data = f.read(min(DOWNLOAD_BUFFER_SIZE, part['next'] - hashed))
+                    if not data:
+                        return hashed
+                    digest.update(data)
+                    hashed += len(data)
+                if part['next'] <= part['end']:
+                    break
+        return hashed
+
+    @staticmethod
+    def discard(dest_path: Path) -> None:
+        """Remove a partial download along with its progress, so it is not resumed"""
+        dest_path.unlink(missing_ok=True)
+        dest_path.with_name(dest_path.name + '.state').unlink(missing_ok=True)
+
+    @staticmethod
+    def _split(size: int, part_count: int) -> List[Dict]:
+        part_size = -(-size // part_count)
+        return [{'start': start, 'end': min(start + part_size, size) - 1, 'next': start}
+                for start in range(0, size, part_size)]
+
+    @staticmethod
+    def _load_parts(state_path: Path, url: str, size: int, validator: Optional[str]) -> Optional[List[Dict]]:
+        """Load progress of an earlier download of the same URL, size and validator"""
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('url') != url or state.get('size') != size or state.get('validator') != validator:
+            return None
+        return state.get('parts')
+
+    @staticmethod
+    def _save_parts(state_path: Path, url: str, size: int, validator: Optional[str], parts: List[Dict]) -> None:
+        temp_path = state_path.with_name(state_path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            # jetbrains bug requires `# type: ignore` (https://youtrack.jetbrains.com/issue/PY-76945)
+            json.dump({'url': url, 'size': size, 'validator': validator,  # type: ignore
+                       'parts': [dict(p) for p in parts]}, f)
+        os.replace(temp_path, state_path)
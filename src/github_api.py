@@ -1,62 +1,236 @@
-import subprocess
-from pathlib import Path
-from typing import Dict, Optional, Tuple
+import os
+from importlib.util import find_spec
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple
 
 import requests
 
+from downloader import ChunkedDownloader
+from platforms import ARCH_ALIASES, normalize_arch, system_libc
+from release_cache import ReleaseCache
+from remote_file import HTTPRangeFile
+from run_report import RunReport
+from scheduler import ScheduledSession
+
+# Repositories resolved per GraphQL query, kept well under GitHub's node limits
+GRAPHQL_BATCH_SIZE = 50
+
+# Supported asset suffixes with the archive type that installs them and a rough decompression
+# throughput in MB of asset per second. Longer suffixes come first so '.tar.gz' wins over '.gz'.
+ASSET_FORMATS = {
+    '.tar.gz': ('tar', 150),
+    '.tgz': ('tar', 150),
+    '.tar.xz': ('tar', 40),
+    '.txz': ('tar', 40),
+    '.tar.bz2': ('tar', 15),
+    '.tbz2': ('tar', 15),
+    '.tar.zst': ('tar.zst', 500),
+    '.tzst': ('tar.zst', 500),
+    '.zip': ('zip', 150),
+    '.gz': ('gz', 150),
+}
+# Suffixes of checksum files published for a single asset, after its full name or its name without archive suffix
+CHECKSUM_SUFFIXES = ('.sha256', '.sha256sum', '.sha256.txt')
+# Names of release files that are never binaries, even without an extension
+NOT_BINARY_WORDS = ('sha256', 'sha512', 'checksum', 'sums', 'sbom', 'license', 'readme', 'changelog')
+# Download speed assumed when estimating install cost, only the ratio to decompression speeds matters
+ASSUMED_DOWNLOAD_SPEED = 10
+# Connect and read timeouts for mirrors, which are on the local network and are not retried
+MIRROR_TIMEOUT = (2, 30)
+
+RELEASE_QUERY_FIELDS = '''
+    latestRelease {
+      tagName
+      url
+      publishedAt
+      description
+      releaseAssets(first: 100) {
+        nodes { name downloadUrl size }
+        pageInfo { hasNextPage }
+      }
+    }'''
+
 
 class GitHubAPI:
-    def __init__(self, logger):
-        self.session = requests.Session()
+    def __init__(self, logger, release_cache: Optional[ReleaseCache] = None,
+                 api_url: str = 'https://api.github.com', token: Optional[str] = None,
+                 download_connections: int = 4, pool_size: int = 10, max_retries: int = 4,
+                 max_rate_limit_wait: float = 300.0, report: Optional[RunReport] = None):
+        self.session = ScheduledSession(logger, max_retries=max_retries, max_rate_limit_wait=max_rate_limit_wait,
+                                        pool_size=pool_size, api_url=api_url)
         self.session.headers.update({
             'Accept': 'application/vnd.github.v3+json',
             'User-Agent': 'BinMgr-Binary-Manager'
         })
+        # Only sent to the API, never to asset hosts or mirrors
+        self._api_headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self.api_url = api_url
+        self.token = token
         self._logger = logger
+        self._downloader = ChunkedDownloader(self.session, logger, download_connections)
+        # GitHub is there as a fallback, so a mirror that is down should fail fast
+        mirror_session = ScheduledSession(logger, max_retries=0, pool_size=pool_size, timeout=MIRROR_TIMEOUT)
+        mirror_session.headers.update(self.session.headers)
+        self._mirror_downloader = ChunkedDownloader(mirror_session, logger, download_connections)
+        self._release_cache = release_cache
+        self._report = report or RunReport()
         self._arch = self._get_system_arch()
+        self._libc = system_libc()
+        self._zstd_available = find_spec('zstandard') is not None
 
     def get_latest_release(self, repo: str) -> Dict:
-        """Get latest release version"""
-        url = f'https://api.github.com/repos/{repo}/releases/latest'
-        response = self.session.get(url)
+        """Get latest release version, revalidating any cached response"""
+        url = f'{self.api_url}/repos/{repo}/releases/latest'
+        cached = self._release_cache.get(repo) if self._release_cache else None
+
+        headers = dict(self._api_headers)
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, headers=headers)
+        if cached and response.status_code == 304:
+            self._logger.debug("Release for %s not modified, using cached response", repo)
+            self._report.count('releases_not_modified')
+            return cached['body']
         response.raise_for_status()
-        return response.json()
+        self._report.count('releases_fetched')
+
+        release_data = response.json()
+        if self._release_cache:
+            self._release_cache.store(repo, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                                      release_data)
+        return release_data
+
+    def get_latest_releases(self, repos: List[str]) -> Dict[str, Dict]:
+        """
+        Get latest releases for many repositories through batched GraphQL queries.
+        Requires a token. Returns release data in the REST layout, keyed by repo;
+        repositories that could not be resolved, or whose assets don't fit on one page, are left out.
+        """
+        if not self.token:
+            raise ValueError("GraphQL release lookup requires a GitHub token")
+
+        releases = {}
+        unique_repos = list(dict.fromkeys(repos))
+        for start in range(0, len(unique_repos), GRAPHQL_BATCH_SIZE):
+            batch = unique_repos[start:start + GRAPHQL_BATCH_SIZE]
+            releases.update(self._query_release_batch(batch))
+            self._report.count('graphql_queries')
+        self._logger.debug("Resolved %d of %d releases via GraphQL", len(releases), len(unique_repos))
+        return releases
+
+    def _query_release_batch(self, repos: List[str]) -> Dict[str, Dict]:
+        """Resolve one batch of repositories in a single GraphQL query"""
+        params = []
+        fields = []
+        variables = {}
+        for i, repo in enumerate(repos):
+            owner, _, name = repo.partition('/')
+            params.append(f'$o{i}: String!, $n{i}: String!')
+            fields.append(f'r{i}: repository(owner: $o{i}, name: $n{i}) {{{RELEASE_QUERY_FIELDS}\n  }}')
+            variables[f'o{i}'] = owner
+            variables[f'n{i}'] = name
+        query = f"query({', '.join(params)}) {{\n  " + '\n  '.join(fields) + '\n}'
+
+        response = self.session.post(f'{self.api_url}/graphql', json={'query': query, 'variables': variables},
+                                     headers=self._api_headers)
+        response.raise_for_status()
+        payload = response.json()
+
+        for error in payload.get('errors') or []:
+            self._logger.debug("GraphQL error: %s", error.get('message'))
+
+        data = payload.get('data') or {}
+        releases = {}
+        for i, repo in enumerate(repos):
+            release = (data.get(f'r{i}') or {}).get('latestRelease')
+            if not release:
+                continue
+            # The Linux asset may be on a later page, leave the repository to the REST lookup
+            if release['releaseAssets'].get('pageInfo', {}).get('hasNextPage'):
+                self._logger.debug("Release of %s has more than 100 assets, using the REST API", repo)
+                continue
+            releases[repo] = self._from_graphql_release(release)
+        return releases
+
+    @staticmethod
+    def _from_graphql_release(release: Dict) -> Dict:
+        """Convert a GraphQL release node to the REST release layout"""
+        return {
+            'tag_name': release['tagName'],
+            'html_url': release.get('url'),
+            'published_at': release.get('publishedAt'),
+            'body': release.get('description') or '',
+            'assets': [
+                {
+                    'name': asset['name'],
+                    'browser_download_url': asset['downloadUrl'],
+                    'size': asset.get('size')
+                }
+                for asset in release['releaseAssets']['nodes']
+            ]
+        }
 
     def _get_system_arch(self) -> str:
-        """Get system architecture"""
+        """Get system architecture, by its canonical name when binaries can be selected for it"""
         try:
-            return subprocess.check_output(['uname', '-m']).decode().strip()
-        except subprocess.SubprocessError:
+            machine = os.uname().machine
+        except (AttributeError, OSError):
             self._logger.error("Failed to detect system architecture, assuming x86_64")
             return 'x86_64'
+        try:
+            return normalize_arch(machine)
+        except ValueError:
+            # Left for asset selection to reject, so only commands that select assets fail
+            return machine
+
+    @property
+    def arch(self) -> str:
+        return self._arch
+
+    @property
+    def libc(self) -> str:
+        return self._libc
 
-    def is_compatible_binary(self, asset_name: str) -> Tuple[bool, str]:
+    def is_compatible_binary(self, asset_name: str, arch: Optional[str] = None,
+                             libc: Optional[str] = None) -> Tuple[bool, str]:
         """
-        Check if an asset is compatible with the current system
-        Returns a tuple of (is_compatible, reason).
+        Check if an asset is compatible with the current system, or with `arch` and `libc` if given
+        Returns a tuple of (is_compatible, reason), raises ValueError for an unsupported architecture.
         """
         name = asset_name.lower()
+        arch = normalize_arch(arch or self._arch)
+        libc = libc or self._libc
 
         # Explicitly reject Windows
         if any(win in name for win in ['windows', '-pc-', '.exe']):
             return False, "Windows binary detected"
 
         # Check archive type
-        if not any(ext in name for ext in ['.tar.gz', '.tgz', '.zip']):
+        archive_type = self._get_archive_type(name)
+        if not archive_type:
             return False, "Not a supported archive format"
+        if archive_type == 'tar.zst' and not self._zstd_available:
+            return False, "The zstandard package is needed for .tar.zst archives"
 
         # Check architecture
-        if self._arch == 'x86_64':
-            if not ('x86_64' in name or 'amd64' in name):
-                return False, "Architecture doesn't match x86_64/amd64"
-            if any(a in name for a in ['386', 'arm64', 'aarch64', 'arm']):
-                return False, (f"Found incompatible architecture indicator:"
-                               f" {[a for a in ['386', 'arm64', 'aarch64', 'arm'] if a in name][0]}")
+        if not any(alias in name for alias in ARCH_ALIASES[arch]):
+            return False, f"Architecture doesn't match {'/'.join(ARCH_ALIASES[arch])}"
+        if arch == 'x86_64' and any(a in name for a in ['386', 'arm64', 'aarch64', 'arm']):
+            return False, (f"Found incompatible architecture indicator:"
+                           f" {[a for a in ['386', 'arm64', 'aarch64', 'arm'] if a in name][0]}")
 
         # Check designated binary platform
         if not any(p in name for p in ['linux', 'unknown-linux']):
             return False, "Not a Linux binary"
 
+        # glibc builds don't run on musl systems, musl builds are usually static and run anywhere
+        if libc == 'musl' and any(word in name for word in ['gnu', 'glibc']):
+            return False, "glibc build for a musl system"
+
         # Check it's not a package
         if any(fmt in name for fmt in ['.deb', '.rpm', '.apk', '.pkg.tar.', '.pacman']):
             return False, (f"Package format detected:"
@@ -64,51 +238,161 @@ class GitHubAPI:
 
         return True, "Compatible binary found"
 
-    def find_linux_binary(self, assets: list, program_name: str) -> Tuple[Optional[Dict], Optional[str]]:
-        """Find the most appropriate Linux binary from archive file"""
-        self._logger.debug(f"Searching for Linux binary among {len(assets)} assets", program_name)
+    def find_linux_binary(self, assets: list, program_name: str, arch: Optional[str] = None,
+                          libc: Optional[str] = None) -> Tuple[Optional[Dict], Optional[str]]:
+        """Find the most appropriate Linux binary from archive file, for `arch` and `libc` if given"""
+        libc = libc or self._libc
+        self._logger.debug("Searching for Linux binary among %d assets", len(assets), program=program_name)
 
         compatible_assets = []
         for asset in assets:
             name = asset['name']
-            is_compatible, reason = self.is_compatible_binary(name)
+            is_compatible, reason = self.is_compatible_binary(name, arch, libc)
 
-            self._logger.debug(f"Checking asset: {name}", program_name)
-            self._logger.debug(f"Compatibility: {reason}", program_name)
+            self._logger.debug("Checking asset: %s", name, program=program_name)
+            self._logger.debug("Compatibility: %s", reason, program=program_name)
 
             if is_compatible:
                 compatible_assets.append((asset, self._get_archive_type(name)))
 
         if not compatible_assets:
-            self._logger.debug("Available assets:", program_name)
-            for asset in assets:
-                self._logger.debug(f"- {asset['name']}", program_name)
+            if self._logger.debug_enabled:
+                self._logger.debug("Available assets:", program=program_name)
+                for asset in assets:
+                    self._logger.debug("- %s", asset['name'], program=program_name)
             return None, None
 
-        # If multiple compatible assets, prefer the one with the program name
-        for asset, archive_type in compatible_assets:
-            if program_name.lower() in asset['name'].lower():
-                self._logger.info(f"Selected asset: {asset['name']}", program_name)
-                return asset, archive_type
+        # Prefer assets named after the program, then the preferred libc, then the cheapest to install
+        asset, archive_type = min(compatible_assets, key=lambda candidate: (
+            program_name.lower() not in candidate[0]['name'].lower(),
+            self._libc_rank(candidate[0]['name'], libc),
+            self._install_cost(candidate[0])
+        ))
+        self._logger.info(f"Selected asset: {asset['name']}", program=program_name)
+        return asset, archive_type
+
+    def select_asset(self, repo: str, release_data: Dict, program_name: str, arch: Optional[str] = None,
+                     libc: Optional[str] = None) -> Tuple[Optional[Dict], Optional[str]]:
+        """Find the Linux binary of a release, reusing the choice made earlier for the same release tag"""
+        libc = libc or self._libc
+        key = f"{program_name}:{normalize_arch(arch or self._arch)}:{libc}:{'zstd' if self._zstd_available else ''}"
+        tag = release_data['tag_name']
+        assets = release_data['assets']
 
-        # If no asset with program name, take the first compatible one
-        self._logger.info(f"Selected asset: {compatible_assets[0][0]['name']}", program_name)
-        return compatible_assets[0]
+        if self._release_cache:
+            asset_name = self._release_cache.get_selection(repo, key, tag)
+            asset = next((a for a in assets if a['name'] == asset_name), None) if asset_name else None
+            if asset:
+                self._logger.info(f"Selected asset: {asset['name']}", program=program_name)
+                self._report.count('asset_selections_reused')
+                return asset, self._get_archive_type(asset['name'])
+
+        asset, archive_type = self.find_linux_binary(assets, program_name, arch, libc)
+        if asset and self._release_cache:
+            self._release_cache.store_selection(repo, key, tag, asset['name'])
+        return asset, archive_type
+
+    @staticmethod
+    def _libc_rank(asset_name: str, libc: str) -> int:
+        """Order of preference for an asset's libc, lower is better"""
+        name = asset_name.lower()
+        if libc == 'musl':
+            return 0 if 'musl' in name else 1
+        return 1 if 'musl' in name else 0
+
+    @staticmethod
+    def _install_cost(asset: Dict) -> float:
+        """Estimated seconds to download and decompress an asset, raw binaries need no decompression"""
+        size_mb = (asset.get('size') or 0) / 1e6
+        name = asset['name'].lower()
+        speed = next((speed for suffix, (_, speed) in ASSET_FORMATS.items() if name.endswith(suffix)), None)
+        return size_mb / ASSUMED_DOWNLOAD_SPEED + (size_mb / speed if speed else 0)
+
+    def get_asset_checksum(self, assets: list, asset: Dict, program_name: Optional[str] = None) -> Optional[str]:
+        """
+        Get the published SHA-256 of an asset, from the asset's own digest
+        or from a checksums file in the same release. Returns None if there is none.
+        """
+        digest = asset.get('digest') or ''
+        if digest.startswith('sha256:'):
+            return digest.split(':', 1)[1].lower()
+
+        checksum_asset, own_file = self._find_checksum_asset(assets, asset['name'])
+        if not checksum_asset:
+            self._logger.debug("No checksums published for this release", program=program_name)
+            return None
+
+        response = self.session.get(checksum_asset['browser_download_url'])
+        response.raise_for_status()
+        checksum = self._parse_checksums(response.text, asset['name'], own_file)
+        if checksum:
+            self._logger.debug("Found checksum in %s", checksum_asset['name'], program=program_name)
+        else:
+            self._logger.debug("No checksum for %s in %s", asset['name'], checksum_asset['name'], program=program_name)
+        return checksum
+
+    @staticmethod
+    def _find_checksum_asset(assets: list, asset_name: str) -> Tuple[Optional[Dict], bool]:
+        """
+        Find the checksums file covering an asset, preferring one made for that asset alone.
+        Returns the file and whether it was matched to the asset by name, None if there is neither.
+        """
+        names = {a['name'].lower(): a for a in assets}
+        asset_name = asset_name.lower()
+        stem = next((asset_name[:-len(suffix)] for suffix in ASSET_FORMATS if asset_name.endswith(suffix)), None)
+        for base in filter(None, (asset_name, stem)):
+            for suffix in CHECKSUM_SUFFIXES:
+                if f'{base}{suffix}' in names:
+                    return names[f'{base}{suffix}'], True
+        # Per-asset files of other assets are skipped, only a combined file can cover this one
+        for name, candidate in names.items():
+            if 'sha256sums' in name or name.endswith(('checksums.txt', 'checksums.sha256')):
+                return candidate, False
+        return None, False
+
+    @staticmethod
+    def _parse_checksums(text: str, asset_name: str, own_file: bool = False) -> Optional[str]:
+        """Parse `sha256sum` output, or a single digest if the file was made for this asset alone"""
+        lines = [line.split() for line in text.splitlines() if line.strip()]
+        for fields in lines:
+            if len(fields) >= 2 and fields[-1].lstrip('*').split('/')[-1] == asset_name and len(fields[0]) == 64:
+                return fields[0].lower()
+        if own_file and len(lines) == 1 and len(lines[0]) == 1 and len(lines[0][0]) == 64:
+            return lines[0][0].lower()
+        return None
 
     @staticmethod
     def _get_archive_type(filename: str) -> Optional[str]:
-        """Determine archive type from filename."""
-        if filename.endswith(('.tar.gz', '.tgz')):
-            return 'tar'
-        elif filename.endswith('.zip'):
-            return 'zip'
+        """Determine archive type from filename, 'binary' for an uncompressed executable."""
+        name = filename.lower()
+        for suffix, (archive_type, _) in ASSET_FORMATS.items():
+            if name.endswith(suffix):
+                return archive_type
+
+        # Raw binaries have no extension, or only a version or platform part after the last dot
+        extension = PurePosixPath(name).suffix[1:]
+        if any(word in name for word in NOT_BINARY_WORDS):
+            return None
+        if not extension or extension == 'bin' or not extension.isalnum() or extension.isdigit():
+            return 'binary'
         return None
 
-    def download_file(self, url: str, dest_path: Path) -> None:
-        """Download archive file"""
+    def open_download(self, url: str) -> requests.Response:
+        """Open a streaming download, the caller reads `response.raw` and closes it"""
         response = self.session.get(url, stream=True)
         response.raise_for_status()
+        response.raw.decode_content = True
+        return response
+
+    def open_remote_file(self, url: str) -> HTTPRangeFile:
+        """Open a download as a seekable file backed by Range requests"""
+        return HTTPRangeFile(self.session, url)
 
-        with open(dest_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+    def download_file(self, url: str, dest_path: Path, program_name: Optional[str] = None,
+                      mirror: bool = False) -> str:
+        """
+        Download archive file, returns its SHA-256 computed while downloading.
+        Mirror downloads use a short timeout and are not retried.
+        """
+        downloader = self._mirror_downloader if mirror else self._downloader
+        return downloader.download(url, dest_path, program_name)
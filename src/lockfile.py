@@ -0,0 +1,46 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+LOCKFILE_VERSION = 2
+
+
+class Lockfile:
+    """
+    Resolved releases for a set of programs, per target such as `x86_64-glibc`.
+    Written by `binmgr resolve` and installed from by `binmgr sync` without any API calls.
+    """
+
+    def __init__(self, targets: Dict[str, Dict[str, Dict]], generated: str = ''):
+        self.targets = targets
+        self.generated = generated or datetime.now().isoformat()
+
+    @classmethod
+    def load(cls, path: Path) -> 'Lockfile':
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('lockfile_version') != LOCKFILE_VERSION:
+            raise ValueError(f"Unsupported lockfile version: {data.get('lockfile_version')}, "
+                             f"run `binmgr resolve` again to update it")
+        return cls(data['targets'], data.get('generated', ''))
+
+    def save(self, path: Path) -> None:
+        """Save lockfile, replacing any previous one in a single step"""
+        temp_path = path.with_name(f'.{path.name}.tmp')
+        with open(temp_path, 'w') as f:
+            # jetbrains bug requires `# type: ignore` (https://youtrack.jetbrains.com/issue/PY-76945)
+            json.dump({  # type: ignore
+                'lockfile_version': LOCKFILE_VERSION,
+                'generated': self.generated,
+                'targets': self.targets
+            }, f, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def get_programs(self, target: str) -> Dict[str, Dict]:
+        """Get the locked programs for a target"""
+        if target not in self.targets:
+            raise ValueError(f"Lockfile has no entries for target {target}, "
+                             f"available: {', '.join(sorted(self.targets)) or 'none'}")
+        return self.targets[target]
@@ -1,9 +1,21 @@
+import atexit
 import logging
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
 from typing import Optional
 
+LOG_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+DEFAULT_LOG_LEVEL = 'debug'
+
 
 class LogLevel(Enum):
     SUCCESS = '\033[92m'    # Green
@@ -14,61 +26,144 @@ class LogLevel(Enum):
     RESET =   '\033[0m'     # Reset
 
 
+LEVEL_NUMBERS = {
+    LogLevel.SUCCESS: logging.INFO,
+    LogLevel.INFO: logging.INFO,
+    LogLevel.WARNING: logging.WARNING,
+    LogLevel.ERROR: logging.ERROR,
+    LogLevel.DEBUG: logging.DEBUG,
+}
+
+
+class _QueueHandler(logging.Handler):
+    """Queue records as they are, so message formatting happens on the writer thread"""
+
+    def __init__(self, log_queue: queue.SimpleQueue):
+        super().__init__()
+        self.queue = log_queue
+
+    def emit(self, record: logging.LogRecord):
+        self.queue.put_nowait(record)
+
+
 class Logger:
-    def __init__(self, log_dir: Path):
+    _output_lock = threading.Lock()
+    # The file handler and its writer thread are shared by every Logger in the process
+    _setup_lock = threading.Lock()
+    _listener = None
+
+    def __init__(self, log_dir: Path, level: str = DEFAULT_LOG_LEVEL):
         self.log_dir = log_dir
         self.log_file = log_dir / f"binmgr_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        self._setup_logger()
+        self._local = threading.local()
+        self.level = LOG_LEVELS[level]
+        self.logger = logging.getLogger('binmgr')
+        self.logger.setLevel(self.level)
+
+    @property
+    def debug_enabled(self) -> bool:
+        """Whether debug messages are written, to skip work done only to log them"""
+        return self.level <= logging.DEBUG
 
     def _setup_logger(self):
-        """Setup file logging"""
-        self.log_dir.mkdir(parents=True, exist_ok=True)
+        """Setup file logging, done once per process on the first message written to the file"""
+        with self._setup_lock:
+            if Logger._listener is not None:
+                return
+            # logging.handlers is slow to import, and no-op runs never get here
+            from logging.handlers import QueueListener
+            self.log_dir.mkdir(parents=True, exist_ok=True)
 
-        # Configure logger with detailed output
-        file_handler = logging.FileHandler(self.log_file)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s'
-        ))
+            # Configure logger with detailed output, written by a background thread
+            file_handler = logging.FileHandler(self.log_file)
+            file_handler.setFormatter(logging.Formatter(
+                '%(asctime)s - %(levelname)s - %(message)s'
+            ))
 
-        self.logger = logging.getLogger('binmgr')
-        self.logger.setLevel(logging.DEBUG)
-        self.logger.addHandler(file_handler)
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler)
+            listener.start()
+            atexit.register(listener.stop)
+
+            self.logger.addHandler(_QueueHandler(log_queue))
+            Logger._listener = listener
+
+    @contextmanager
+    def buffered(self):
+        """
+        Hold terminal output of the current thread and print it as one block.
+        The log file gets each message right away, so its timestamps show when things happened.
+        """
+        self._local.buffer = []
+        try:
+            yield
+        finally:
+            entries = self._local.buffer
+            self._local.buffer = None
+            with self._output_lock:
+                for entry in entries:
+                    self._print(*entry)
 
     def log(self, message: str, level: LogLevel, program: Optional[str] = None, terminal_only: bool = False,
-            file_only: bool = False):
-        """Log to file and/or terminal based on flags"""
-        prefix = f"[{program}] " if program else ""
+            file_only: bool = False, args: tuple = ()):
+        """Log to file and/or terminal based on flags, `message % args` is only built if it is written"""
+        if not terminal_only and LEVEL_NUMBERS[level] < self.level:
+            if file_only:
+                return
+            terminal_only = True
 
-        # detailed file logging
+        prefix = f"[{program}] " if program else ""
         if not terminal_only:
-            if level == LogLevel.DEBUG:
-                self.logger.debug(f"{prefix}{message}")
-            elif level == LogLevel.INFO:
-                self.logger.info(f"{prefix}{message}")
-            elif level == LogLevel.WARNING:
-                self.logger.warning(f"{prefix}{message}")
-            elif level == LogLevel.ERROR:
-                self.logger.error(f"{prefix}{message}")
-            elif level == LogLevel.SUCCESS:
-                self.logger.info(f"{prefix}SUCCESS: {message}")
-
-        # minimal terminal logging
-        if not file_only:
-            print(f"{level.value}{prefix}{message}{LogLevel.RESET.value}")
-
-    def success(self, message: str, program: Optional[str] = None):
+            self._write_file(prefix, message, args, level)
+        if file_only:
+            return
+
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            buffer.append((prefix, message, args, level))
+            return
+
+        with self._output_lock:
+            self._print(prefix, message, args, level)
+
+    def _write_file(self, prefix: str, message: str, args: tuple, level: LogLevel):
+        """detailed file logging, records are queued for the writer thread"""
+        if Logger._listener is None:
+            self._setup_logger()
+        if args:
+            prefix = prefix.replace('%', '%%')
+        if level == LogLevel.DEBUG:
+            self.logger.debug(f"{prefix}{message}", *args)
+        elif level == LogLevel.INFO:
+            self.logger.info(f"{prefix}{message}", *args)
+        elif level == LogLevel.WARNING:
+            self.logger.warning(f"{prefix}{message}", *args)
+        elif level == LogLevel.ERROR:
+            self.logger.error(f"{prefix}{message}", *args)
+        elif level == LogLevel.SUCCESS:
+            self.logger.info(f"{prefix}SUCCESS: {message}", *args)
+
+    @staticmethod
+    def _print(prefix: str, message: str, args: tuple, level: LogLevel):
+        """minimal terminal logging"""
+        text = message % args if args else message
+        print(f"{level.value}{prefix}{text}{LogLevel.RESET.value}")
+
+    def success(self, message: str, *, program: Optional[str] = None):
         self.log(message, LogLevel.SUCCESS, program)
 
-    def info(self, message: str, program: Optional[str] = None, file_only: bool = False):
+    def info(self, message: str, *, program: Optional[str] = None, file_only: bool = False):
         self.log(message, LogLevel.INFO, program, file_only=file_only)
 
-    def warning(self, message: str, program: Optional[str] = None):
+    def warning(self, message: str, *, program: Optional[str] = None):
         self.log(message, LogLevel.WARNING, program)
 
-    def error(self, message: str, program: Optional[str] = None):
+    def error(self, message: str, *, program: Optional[str] = None):
         self.log(message, LogLevel.ERROR, program)
 
-    def debug(self, message: str, program: Optional[str] = None):
-        """Debug messages default to file only"""
-        self.log(message, LogLevel.DEBUG, program, file_only=True)
+    def debug(self, message: str, *args, program: Optional[str] = None):
+        """
+        Debug messages default to file only, formatted like `logging` with `message % args`.
+        That is why `program` is keyword-only here and in the other methods.
+        """
+        self.log(message, LogLevel.DEBUG, program, file_only=True, args=args)
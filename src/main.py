@@ -1,115 +1,667 @@
 import argparse
 import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Optional, Dict, List, Tuple
 
 from binary_manager import BinaryManager
 from config import ConfigManager
-from github_api import GitHubAPI
-from logger import Logger
+from download_cache import DownloadCache
+from lockfile import Lockfile
+from logger import DEFAULT_LOG_LEVEL, LOG_LEVELS, Logger
+from platforms import ARCH_ALIASES, LIBCS, format_target, parse_target
+from release_cache import ReleaseCache
+from run_report import RunReport
 from version_tracker import VersionTracker
 
+# requests and the modules built on it are imported on first use,
+# so runs that never touch the network start quickly
+if TYPE_CHECKING:
+    from github_api import GitHubAPI
+
+
+DEFAULT_JOBS = 4
+DEFAULT_LOCKFILE = 'binmgr.lock'
+DEFAULT_MIRROR_HOST = '127.0.0.1'
+DEFAULT_MIRROR_PORT = 8754
+# Check intervals are shortened by up to this fraction, differently for each program,
+# so programs first checked together drift apart and API calls spread across runs
+CHECK_STAGGER = 0.2
+
 
 class BinMgr:
-    def __init__(self, config_path: Optional[str] = None):
-        self.config = ConfigManager(config_path)
-        self.logger = Logger(self.config.bin_dir / 'logs')
-        self.github = GitHubAPI(self.logger)
-        self.binary_manager = BinaryManager(self.config.bin_dir, self.config.temp_dir, self.logger)
-        self.version_tracker = VersionTracker(self.config.version_file)
+    def __init__(self, config_path: Optional[str] = None, jobs: int = DEFAULT_JOBS, stream: bool = False,
+                 config_required: bool = True, force: bool = False, log_level: Optional[str] = None):
+        self.config = ConfigManager(config_path, required=config_required)
+        self.jobs = max(1, jobs)
+        self.force = force
+        self.stream = stream or self.config.get_stream_extract()
+        self.logger = Logger(self.config.bin_dir / 'logs', log_level or self.config.get_log_level())
+        self.release_cache = ReleaseCache(self.config.release_cache_file)
+        self.report = RunReport()
+        self._github: Optional['GitHubAPI'] = None
+        self._github_lock = threading.Lock()
+        self.binary_manager = BinaryManager(self.config.bin_dir, self.config.temp_dir, self.logger,
+                                            self.config.store_dir)
+        self.version_tracker = VersionTracker(self.config.version_file, self.config.get_version_flush_interval())
+        cache_max_bytes = self.config.get_cache_max_bytes()
+        self.download_cache = (DownloadCache(self.config.get_cache_dir(), cache_max_bytes)
+                               if cache_max_bytes > 0 else None)
+        self.mirror_url = self.config.get_mirror_url()
+        # Set on the first connection failure, so the rest of the run goes straight to GitHub
+        self._mirror_unavailable = threading.Event()
         self.failed_programs: List[Tuple[str, str]] = []
         self.programs: Dict[str, str] = {}
+        self.releases: Dict[str, Dict] = {}
+
+    @property
+    def github(self) -> 'GitHubAPI':
+        """GitHub client, created on first use."""
+        with self._github_lock:
+            if self._github is None:
+                from github_api import GitHubAPI
+
+                download_connections = self.config.get_download_connections()
+                self._github = GitHubAPI(self.logger, self.release_cache, api_url=self.config.get_api_url(),
+                                         token=self.config.get_github_token(),
+                                         download_connections=download_connections,
+                                         # Every worker may hold a ranged download plus an API call
+                                         pool_size=self.jobs * (download_connections + 1),
+                                         max_retries=self.config.get_max_retries(),
+                                         max_rate_limit_wait=self.config.get_rate_limit_max_wait(),
+                                         report=self.report)
+            return self._github
 
     def run(self):
         """Entry point"""
+        with self.version_tracker.locked(self._wait_for_lock):
+            try:
+                self._prepare()
+                self.programs = self.config.get_programs()
+                due_programs = self._due_programs()
+                self._prefetch_releases(due_programs)
+                self._run_all(due_programs, self._process_program)
+
+            finally:
+                self.release_cache.save()
+                self.config.cleanup()
+
+    def check(self) -> Dict[str, Tuple[Optional[str], str]]:
+        """Report programs with a newer release available, without installing anything."""
+        self.programs = self.config.get_programs()
+        due_programs = self._due_programs()
+        self._prefetch_releases(due_programs)
+        pending: Dict[str, Tuple[Optional[str], str]] = {}
+
+        def check_program(program_name: str, repo: str):
+            release_data = self.releases.get(repo) or self.github.get_latest_release(repo)
+            current_version = self.version_tracker.get_version(program_name)
+            latest_version = release_data['tag_name']
+            if current_version == latest_version:
+                self.logger.debug("Up to date at %s", latest_version, program=program_name)
+                return
+            if self._is_held(program_name, latest_version):
+                self.logger.debug("Version %s is held after a rollback", latest_version, program=program_name)
+                return
+            pending[program_name] = (current_version, latest_version)
+            self.logger.info(f"Update available: {current_version or 'not installed'} -> {latest_version}",
+                             program=program_name)
+
         try:
-            self.config.ensure_directories()
-            self.programs = self.config.get_programs()
+            self._run_all(due_programs, check_program)
+        finally:
+            self.release_cache.save()
+
+        if pending:
+            self.logger.info(f"{len(pending)} update(s) pending")
+        else:
+            self.logger.success("All checked programs are up to date")
+        return pending
+
+    def resolve(self, lock_path: Path, targets: List[str]):
+        """Resolve the latest release of every program once per ARCH-LIBC target and write a lockfile."""
+        platforms = list(dict.fromkeys(parse_target(target) for target in targets))
+        with self.version_tracker.locked(self._wait_for_lock):
+            try:
+                self._prepare()
+                self.programs = self.config.get_programs()
+                self._prefetch_releases(self.programs)
+
+                locked: Dict[str, Dict[str, Dict]] = {format_target(*platform): {} for platform in platforms}
+
+                def resolve_program(program_name: str, repo: str):
+                    for target, entry in self._resolve_program(program_name, repo, platforms).items():
+                        locked[target][program_name] = entry
+
+                self._run_all(self.programs, resolve_program)
+                Lockfile(locked).save(lock_path)
+                self.logger.success(f"Wrote lockfile for {', '.join(locked)} to {lock_path}")
+
+            finally:
+                self.release_cache.save()
+                self.config.cleanup()
+
+    def sync(self, lock_path: Path):
+        """Install the programs pinned in a lockfile for this architecture and C library, without any API calls."""
+        with self.version_tracker.locked(self._wait_for_lock):
+            try:
+                self._prepare()
+                locked = Lockfile.load(lock_path).get_programs(format_target(self.github.arch, self.github.libc))
+                self._run_all(locked, self._sync_program)
 
-            for program_name, repo in self.programs.items():
+            finally:
+                self.config.cleanup()
+
+    def rollback(self, program_name: str):
+        """Switch a program back to its previously installed version, without any network access."""
+        with self.version_tracker.locked(self._wait_for_lock):
+            restored = self.version_tracker.rollback(program_name)
+            if not restored:
+                raise ValueError(f"No previous version of {program_name} is available to roll back to")
+            self.binary_manager.activate(Path(restored['path']), program_name)
+            self.logger.success(f"Rolled back to version {restored['version']}", program=program_name)
+
+    def _wait_for_lock(self):
+        self.logger.info("Another binmgr run is in progress, waiting for it to finish")
+
+    def serve(self, host: str, port: int):
+        """Serve the download cache and versions file to other binmgr clients."""
+        from mirror import MirrorServer
+
+        if not self.download_cache:
+            raise ValueError("Serving a mirror requires the download cache to be enabled")
+        self.download_cache.ensure_directories()
+
+        with MirrorServer((host, port), self.download_cache, self.config.version_file, self.logger) as server:
+            self.logger.info(f"Serving {self.download_cache.cache_dir} on http://{host}:{server.server_port}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                self.logger.info("Mirror stopped")
+
+    def print_summary(self):
+        """Print the phase timings of this run as a table."""
+        for line in self.report.summary_lines():
+            self.logger.info(line)
+
+    def _prepare(self):
+        self.config.ensure_directories()
+        if self.download_cache:
+            self.download_cache.ensure_directories()
+
+    def _run_all(self, work: Dict[str, Any], process: Callable[[str, Any], None]):
+        """Process every program, then deal with any failures."""
+        self.failed_programs = self._process_all(list(work.items()), process)
+        if self.failed_programs:
+            self._handle_failures(work, process)
+
+    def _due_programs(self) -> Dict[str, str]:
+        """Programs whose check interval has passed, or all of them when forced."""
+        if self.force:
+            return dict(self.programs)
+
+        now = time.time()
+        due = {}
+        for program_name, repo in self.programs.items():
+            next_check = self._next_check(program_name)
+            if next_check is None or next_check <= now:
+                due[program_name] = repo
+            else:
+                self.logger.debug("Checked recently, next check in %.0f min", (next_check - now) / 60,
+                                  program=program_name)
+
+        skipped = len(self.programs) - len(due)
+        if skipped:
+            self.report.count('programs_skipped', skipped)
+            self.logger.info(f"Skipping {skipped} program(s) checked within their check interval, use --force "
+                             f"to check them anyway")
+        return due
+
+    def _next_check(self, program_name: str) -> Optional[float]:
+        """When a program is next due for a check, None if it is always due."""
+        interval = self.config.get_check_interval(program_name)
+        last_checked = self.version_tracker.get_last_checked(program_name)
+        if not interval or last_checked is None:
+            return None
+        offset = zlib.crc32(program_name.encode()) / 2 ** 32
+        return last_checked + interval * (1 - CHECK_STAGGER * offset)
+
+    def _prefetch_releases(self, programs: Dict[str, str]):
+        """Resolve all latest releases in batched GraphQL queries when a token is available."""
+        if not programs or not self.config.get_github_token():
+            return
+        try:
+            self.releases = self.github.get_latest_releases(list(programs.values()))
+        except Exception as e:
+            self.logger.warning(f"Batched release lookup failed, falling back to per-repo requests: {str(e)}")
+            self.releases = {}
+
+    def _process_all(self, programs: List[Tuple[str, Any]],
+                     process: Callable[[str, Any], None]) -> List[Tuple[str, str]]:
+        """Process programs on a bounded worker pool and collect failures."""
+        failed: List[Tuple[str, str]] = []
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(programs) or 1)) as executor:
+            futures = {executor.submit(self._process_buffered, process, program_name, item): program_name
+                       for program_name, item in programs}
+            for future in as_completed(futures):
+                program_name = futures[future]
                 try:
-                    self._process_program(program_name, repo)
+                    future.result()
                 except Exception as e:
-                    self.logger.error(f"Failed to process: {str(e)}", program_name)
-                    self.failed_programs.append((program_name, str(e)))
+                    self.logger.error(f"Failed to process: {str(e)}", program=program_name)
+                    failed.append((program_name, str(e)))
+        return failed
 
-            if self.failed_programs:
-                self._handle_failures()
-
-        finally:
-            self.config.cleanup()
+    def _process_buffered(self, process: Callable[[str, Any], None], program_name: str, item: Any):
+        """Process a program, keeping its log output together."""
+        with self.logger.buffered():
+            process(program_name, item)
 
     def _process_program(self, program_name: str, repo: str):
         """Process a single program."""
-        self.logger.info(f"Processing {program_name} from {repo}", program_name)
+        self.logger.info(f"Processing {program_name} from {repo}", program=program_name)
 
         try:
-            # Get latest release
-            release_data = self.github.get_latest_release(repo)
-            latest_version = release_data['tag_name']
-            self.logger.info(f"Latest version: {latest_version}", program_name)
+            with self.report.program(program_name) as program_report:
+                # Get latest release
+                with self.report.span(program_name, 'release_lookup') as span:
+                    release_data = self.releases.get(repo)
+                    span['source'] = 'graphql' if release_data else 'rest'
+                    if not release_data:
+                        release_data = self.github.get_latest_release(repo)
+                latest_version = release_data['tag_name']
+                self.logger.info(f"Latest version: {latest_version}", program=program_name)
 
-            # Check if update needed
-            current_version = self.version_tracker.get_version(program_name)
-            if current_version == latest_version:
-                self.logger.success(f"Already at latest version {latest_version}", program_name)
-                return
+                # Check if update needed
+                current_version = self.version_tracker.get_version(program_name)
+                program_report.update(current_version=current_version, latest_version=latest_version)
+                if current_version == latest_version:
+                    self.logger.success(f"Already at latest version {latest_version}", program=program_name)
+                    self.version_tracker.mark_checked(program_name)
+                    program_report['status'] = 'up_to_date'
+                    return
+                if self._is_held(program_name, latest_version):
+                    self.logger.info(f"Staying at {current_version}, {latest_version} was rolled back. "
+                                     f"Use --force to install it anyway", program=program_name)
+                    self.version_tracker.mark_checked(program_name)
+                    program_report['status'] = 'held'
+                    return
+                if self._activate_stored(program_name, latest_version, release_data):
+                    self.version_tracker.mark_checked(program_name)
+                    program_report['status'] = 'updated'
+                    return
+
+                # Find appropriate binary
+                with self.report.span(program_name, 'asset_selection', assets=len(release_data['assets'])):
+                    asset, archive_type = self.github.select_asset(repo, release_data, program_name)
+                if not asset:
+                    raise ValueError(f"No suitable binary found in release {latest_version}")
+                if not archive_type:
+                    raise ValueError(f"Unsupported archive type for asset: {asset['name']}")
 
-            # Find appropriate binary
-            asset, archive_type = self.github.find_linux_binary(release_data['assets'], program_name)
-            if not asset:
-                raise ValueError(f"No suitable binary found in release {latest_version}")
-            if not archive_type:
-                raise ValueError(f"Unsupported archive type for asset: {asset['name']}")
-
-            # Download and process
-            archive_path = self.config.temp_dir / asset['name']
-            self.logger.info(f"Downloading from: {asset['browser_download_url']}", program_name)
-            self.github.download_file(asset['browser_download_url'], archive_path)
-
-            # Extract and find binary.
-            extracted_files = self.binary_manager.extract_archive(archive_path, archive_type)
-            binary_path = self.binary_manager.find_binary(extracted_files, program_name)
-            if not binary_path:
-                raise ValueError("Could not find binary in extracted files")
-
-            # Install
-            self.binary_manager.install_binary(binary_path, program_name)
-            self.version_tracker.update_version(program_name, latest_version, release_data)
-            self.logger.success(f"Successfully updated to version {latest_version}", program_name)
+                with self.report.span(program_name, 'checksum'):
+                    expected_sha256 = self.github.get_asset_checksum(release_data['assets'], asset, program_name)
+                self._install_asset(program_name, latest_version, asset, archive_type, release_data,
+                                    expected_sha256)
+                self.version_tracker.mark_checked(program_name)
+                program_report['status'] = 'updated'
 
         except Exception as e:
-            self.logger.error(f"Failed: {str(e)}", program_name)
+            self.logger.error(f"Failed: {str(e)}", program=program_name)
             raise
 
-    def _handle_failures(self):
-        """Handle failed updates."""
-        self.logger.warning("\nThe following programs failed to update:")
-        for program, error in self.failed_programs:
-            self.logger.error(f"{program}: {error}")
+    def _is_held(self, program_name: str, version: str) -> bool:
+        """Whether a rollback holds the program back from `version`, --force releases every hold."""
+        return not self.force and self.version_tracker.get_held_from(program_name) == version
 
-        if input("\nWould you like to retry failed updates? (y/n): ").lower() == 'y':
-            failed_programs = [(prog, self.programs[prog]) for prog, _ in self.failed_programs]
-            self.failed_programs = []
-            for program_name, repo in failed_programs:
-                try:
-                    self._process_program(program_name, repo)
-                except Exception as e:
-                    self.logger.error(f"Retry failed: {str(e)}", program_name)
+    def _sync_program(self, program_name: str, entry: Dict):
+        """Install a single program as pinned in the lockfile."""
+        self.logger.info(f"Syncing {program_name} to {entry['tag']}", program=program_name)
+
+        try:
+            with self.report.program(program_name) as program_report:
+                current_version = self.version_tracker.get_version(program_name)
+                program_report.update(current_version=current_version, latest_version=entry['tag'])
+                if current_version == entry['tag']:
+                    self.logger.success(f"Already at locked version {entry['tag']}", program=program_name)
+                    program_report['status'] = 'up_to_date'
+                    return
+                if self._activate_stored(program_name, entry['tag'], entry['release']):
+                    program_report['status'] = 'updated'
+                    return
+
+                asset = {'name': entry['asset_name'], 'browser_download_url': entry['url']}
+                self._install_asset(program_name, entry['tag'], asset, entry['archive_type'], entry['release'],
+                                    entry['sha256'])
+                program_report['status'] = 'updated'
+
+        except Exception as e:
+            self.logger.error(f"Failed: {str(e)}", program=program_name)
+            raise
+
+    def _resolve_program(self, program_name: str, repo: str,
+                         platforms: List[Tuple[str, str]]) -> Dict[str, Dict]:
+        """Pin a program's latest release for each (arch, libc) platform, keyed by target."""
+        release_data = self.releases.get(repo) or self.github.get_latest_release(repo)
+        self.logger.info(f"Latest version: {release_data['tag_name']}", program=program_name)
+
+        entries = {}
+        for arch, libc in platforms:
+            target = format_target(arch, libc)
+            asset, archive_type = self.github.select_asset(repo, release_data, program_name, arch, libc)
+            if not asset or not archive_type:
+                self.logger.warning(f"No suitable binary for {target} in release {release_data['tag_name']}",
+                                    program=program_name)
+                continue
+
+            sha256 = (self.github.get_asset_checksum(release_data['assets'], asset, program_name)
+                      or self._download_sha256(program_name, asset['browser_download_url']))
+            entries[target] = {
+                'repo': repo,
+                'tag': release_data['tag_name'],
+                'asset_name': asset['name'],
+                'url': asset['browser_download_url'],
+                'size': asset.get('size'),
+                'sha256': sha256,
+                'archive_type': archive_type,
+                'release': {
+                    'published_at': release_data.get('published_at'),
+                    'html_url': release_data.get('html_url')
+                }
+            }
+        return entries
+
+    def _download_sha256(self, program_name: str, url: str) -> str:
+        """Hash an asset that has no published checksum, keeping it in the download cache."""
+        if self.download_cache:
+            with self.download_cache.claim(url):
+                cached_path = self.download_cache.lookup(url)
+                if cached_path:
+                    return cached_path.name
+                partial_path = self.download_cache.partial_path(url)
+                sha256 = self.github.download_file(url, partial_path, program_name)
+                self.download_cache.store(url, partial_path, sha256)
+                return sha256
+
+        work_dir = self.config.temp_dir / program_name
+        work_dir.mkdir(exist_ok=True)
+        download_path = work_dir / 'asset'
+        sha256 = self.github.download_file(url, download_path, program_name)
+        download_path.unlink()
+        return sha256
+
+    def _install_asset(self, program_name: str, version: str, asset: Dict, archive_type: str,
+                       release_data: Dict, expected_sha256: Optional[str]):
+        """Download, extract and install a program binary from a release asset."""
+        # Download, extract and find binary
+        binary_path, asset_sha256 = self._fetch_binary(program_name, asset, archive_type, expected_sha256)
+        if not binary_path:
+            raise ValueError("Could not find binary in extracted files")
+
+        # Install, a raw binary asset is the binary itself, so its digest is already known
+        with self.report.span(program_name, 'install'):
+            binary_sha256, store_path = self.binary_manager.install_binary(
+                binary_path, program_name, version, self.version_tracker.get_binary_sha256(program_name),
+                binary_sha256=asset_sha256 if archive_type == 'binary' else None)
+        self.version_tracker.update_version(program_name, version, release_data, asset_sha256=asset_sha256,
+                                            binary_sha256=binary_sha256, path=store_path)
+        self.logger.success(f"Successfully updated to version {version}", program=program_name)
+        self._prune_versions(program_name)
+
+    def _activate_stored(self, program_name: str, version: str, release_data: Dict) -> bool:
+        """
+        Switch back to a previously installed version that is still in the store, without downloading it.
+        The stored binary is only used if it still matches its recorded digest.
+        """
+        stored = self.version_tracker.get_stored(program_name, version)
+        if not stored or not stored.get('binary_sha256') or not stored.get('path'):
+            return False
+        store_path = Path(stored['path'])
+        if not store_path.is_file():
+            return False
+
+        with self.report.span(program_name, 'install', source='store'):
+            if self.binary_manager.file_sha256(store_path) != stored['binary_sha256']:
+                self.logger.warning(f"Stored copy of {version} does not match its recorded digest, "
+                                    f"downloading it again", program=program_name)
+                return False
+            self.binary_manager.activate(store_path, program_name)
+        self.version_tracker.update_version(program_name, version, release_data,
+                                            asset_sha256=stored.get('asset_sha256'),
+                                            binary_sha256=stored['binary_sha256'], path=store_path)
+        self.logger.success(f"Switched to stored version {version}", program=program_name)
+        self._prune_versions(program_name)
+        return True
+
+    def _prune_versions(self, program_name: str):
+        """Remove stored versions beyond the retention limit."""
+        removed = self.version_tracker.prune_history(program_name, self.config.get_keep_versions())
+        in_use = {self.version_tracker.versions[program_name].get('path')}
+        in_use.update(entry.get('path') for entry in self.version_tracker.get_history(program_name))
+        for entry in removed:
+            if entry.get('path') and entry['path'] not in in_use:
+                self.binary_manager.remove_stored(Path(entry['path']), program_name)
+
+    def _fetch_binary(self, program_name: str, asset: Dict, archive_type: str,
+                      expected_sha256: Optional[str] = None) -> Tuple[Optional[Path], Optional[str]]:
+        """
+        Download an asset and return the path of the program binary inside it,
+        along with the asset's SHA-256 when the whole asset was read.
+        """
+        import requests
+        from downloader import HashingReader
+        from remote_file import RangeNotSupported
+
+        work_dir = self.config.temp_dir / program_name
+        work_dir.mkdir(exist_ok=True)
+        url = asset['browser_download_url']
+        extract_dir = work_dir / 'extracted'
+
+        cached_path = self.download_cache.lookup(url, expected_sha256) if self.download_cache else None
+        if cached_path:
+            self.report.count('download_cache_hits')
+            self.logger.info(f"Using cached download of: {url}", program=program_name)
+            return self._extract_binary(program_name, cached_path, archive_type, extract_dir), cached_path.name
+        if self.download_cache:
+            self.report.count('download_cache_misses')
+
+        if self.mirror_url and not self._mirror_unavailable.is_set():
+            from mirror import mirror_asset_url
+            mirror_url = mirror_asset_url(self.mirror_url, url, expected_sha256)
+            try:
+                archive_path, sha256 = self._download_archive(program_name, mirror_url, url, work_dir / asset['name'],
+                                                              expected_sha256, source='mirror')
+            # Request errors, broken transfers (OSError) and checksum mismatches (ValueError) all fall back to GitHub
+            except (OSError, ValueError) as e:
+                self.report.count('mirror_misses')
+                if isinstance(e, requests.ConnectionError) and not self._mirror_unavailable.is_set():
+                    self._mirror_unavailable.set()
+                    self.logger.warning(f"Mirror {self.mirror_url} is unavailable, using GitHub for this run")
+                self.logger.debug("Mirror download failed, using GitHub: %s", e, program=program_name)
+            else:
+                self.report.count('mirror_downloads')
+                self.logger.info(f"Downloaded from mirror: {mirror_url}", program=program_name)
+                return self._extract_binary(program_name, archive_path, archive_type, extract_dir), sha256
+
+        if self.stream and archive_type in ('tar', 'tar.zst'):
+            self.logger.info(f"Streaming from: {url}", program=program_name)
+            # Extraction happens while downloading, so it is timed as part of the download
+            with self.report.span(program_name, 'download', source='stream') as span, \
+                    self.github.open_download(url) as response:
+                stream = HashingReader(response.raw)
+                binary_path = self.binary_manager.stream_extract_tar(stream, extract_dir, program_name, archive_type)
+                sha256 = stream.finish()
+                span['bytes'] = stream.bytes_read
+            self._verify_checksum(sha256, expected_sha256)
+            return binary_path, sha256
+
+        # A published checksum covers the whole archive, so only fetch part of it when there is none
+        if self.stream and archive_type == 'zip' and not expected_sha256:
+            try:
+                with self.report.span(program_name, 'download', source='range') as span, \
+                        self.github.open_remote_file(url) as remote_file:
+                    self.logger.info(f"Fetching binary from: {url}", program=program_name)
+                    binary_path = self.binary_manager.extract_zip_member(remote_file, extract_dir, program_name)
+                    span['bytes'] = remote_file.bytes_fetched
+                    self.logger.debug("Read %d of %d bytes in %d requests", remote_file.bytes_fetched,
+                                      remote_file.size, remote_file.requests_made, program=program_name)
+                    return binary_path, None
+            except RangeNotSupported:
+                self.logger.debug("Server does not support Range requests, downloading whole archive",
+                                  program=program_name)
+
+        self.logger.info(f"Downloading from: {url}", program=program_name)
+        archive_path, sha256 = self._download_archive(program_name, url, url, work_dir / asset['name'],
+                                                      expected_sha256)
+        return self._extract_binary(program_name, archive_path, archive_type, extract_dir), sha256
+
+    def _extract_binary(self, program_name: str, archive_path: Path, archive_type: str,
+                        extract_dir: Path) -> Optional[Path]:
+        """Extract a downloaded archive and find the program binary in it."""
+        with self.report.span(program_name, 'extract', archive_type=archive_type) as span:
+            extracted_files = self.binary_manager.extract_archive(archive_path, archive_type, extract_dir,
+                                                                  program_name)
+            span['files'] = len(extracted_files)
+        with self.report.span(program_name, 'find_binary'):
+            return self.binary_manager.find_binary(extracted_files, program_name)
+
+    def _download_archive(self, program_name: str, source_url: str, url: str, temp_path: Path,
+                          expected_sha256: Optional[str], source: str = 'github') -> Tuple[Path, str]:
+        """Download an asset from `source_url` into the download cache, or `temp_path` without a cache."""
+        if not self.download_cache:
+            return temp_path, self._download_to(program_name, source_url, temp_path, expected_sha256, source)
+
+        # Programs sharing an asset download it once, the others wait and find it in the cache
+        with self.download_cache.claim(url):
+            cached_path = self.download_cache.lookup(url, expected_sha256)
+            if cached_path:
+                self.report.count('downloads_shared')
+                return cached_path, cached_path.name
+            download_path = self.download_cache.partial_path(url)
+            sha256 = self._download_to(program_name, source_url, download_path, expected_sha256, source)
+            return self.download_cache.store(url, download_path, sha256), sha256
+
+    def _download_to(self, program_name: str, source_url: str, download_path: Path, expected_sha256: Optional[str],
+                     source: str) -> str:
+        """
+        Download an asset to `download_path` and verify it, returns its SHA-256.
+        A failed mirror download is removed, so the download from GitHub starts afresh.
+        """
+        try:
+            with self.report.span(program_name, 'download', source=source) as span:
+                sha256 = self.github.download_file(source_url, download_path, program_name,
+                                                   mirror=source == 'mirror')
+                span['bytes'] = download_path.stat().st_size
+            self._verify_checksum(sha256, expected_sha256, download_path)
+        except BaseException:
+            if source == 'mirror':
+                from downloader import ChunkedDownloader
+                ChunkedDownloader.discard(download_path)
+            raise
+        return sha256
+
+    @staticmethod
+    def _verify_checksum(sha256: str, expected_sha256: Optional[str], download_path: Optional[Path] = None):
+        """Raise if a download doesn't match its published checksum, removing the bad file."""
+        if expected_sha256 and sha256 != expected_sha256:
+            if download_path:
+                download_path.unlink(missing_ok=True)
+            raise ValueError(f"Checksum mismatch: expected {expected_sha256}, got {sha256}")
+
+    def _handle_failures(self, work: Dict[str, Any], process: Callable[[str, Any], None]):
+        """Retry failed updates without prompting, then report whatever still failed."""
+        for _ in range(self.config.get_retry_failed()):
+            if not self.failed_programs:
+                break
+            self.logger.warning(f"\nRetrying {len(self.failed_programs)} failed program(s)")
+            failed_programs = [(prog, work[prog]) for prog, _ in self.failed_programs]
+            self.failed_programs = self._process_all(failed_programs, process)
+
+        if self.failed_programs:
+            self.logger.warning("\nThe following programs failed to update:")
+            for program, error in self.failed_programs:
+                self.logger.error(f"{program}: {error}")
 
 
 def main():
     parser = argparse.ArgumentParser(description="BinMgr - GitHub Binary Manager")
     parser.add_argument('--config', help='Path to configuration file')
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                        help=f'Number of programs to update concurrently (default: {DEFAULT_JOBS})')
+    parser.add_argument('--stream', action='store_true',
+                        help='Extract tar archives while downloading and fetch only the binary from zip archives')
+    parser.add_argument('--check', action='store_true',
+                        help='Only report programs with pending updates, without installing them')
+    parser.add_argument('--force', action='store_true',
+                        help='Check every program, even those checked within their check interval, '
+                             'and install versions held back by a rollback')
+    parser.add_argument('--report', metavar='PATH',
+                        help='Write per-program phase timings and counters to a JSON file')
+    parser.add_argument('--summary', action='store_true',
+                        help='Print a table of phase timings per program at the end of the run')
+    parser.add_argument('--log-level', choices=LOG_LEVELS,
+                        help=f'Lowest level written to the log file (default: {DEFAULT_LOG_LEVEL})')
+    parser.set_defaults(command='update')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    commands.add_parser('update', help='Update all configured programs (default)')
+
+    resolve_parser = commands.add_parser('resolve', help='Resolve latest releases into a lockfile')
+    resolve_parser.add_argument('--target', action='append', dest='targets', metavar='ARCH-LIBC',
+                                choices=[format_target(alias, libc) for aliases in ARCH_ALIASES.values()
+                                         for alias in aliases for libc in LIBCS],
+                                help='Architecture and C library to resolve for, such as x86_64-musl, '
+                                     'may be repeated (default: this machine)')
+    resolve_parser.add_argument('--output', '-o', default=DEFAULT_LOCKFILE,
+                                help=f'Lockfile to write (default: {DEFAULT_LOCKFILE})')
+
+    sync_parser = commands.add_parser('sync', help='Install the releases pinned in a lockfile')
+    sync_parser.add_argument('--lock', default=DEFAULT_LOCKFILE,
+                             help=f'Lockfile to install from (default: {DEFAULT_LOCKFILE})')
+
+    rollback_parser = commands.add_parser('rollback', help='Switch a program back to its previous version')
+    rollback_parser.add_argument('program', help='Name of the program to roll back')
+
+    serve_parser = commands.add_parser('serve', help='Serve the download cache as a mirror for other machines')
+    serve_parser.add_argument('--host', default=DEFAULT_MIRROR_HOST,
+                              help=f'Address to listen on, 0.0.0.0 to serve the LAN (default: {DEFAULT_MIRROR_HOST})')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_MIRROR_PORT,
+                              help=f'Port to listen on (default: {DEFAULT_MIRROR_PORT})')
     args = parser.parse_args()
 
+    bot = None
     try:
-        bot = BinMgr(args.config)
-        bot.run()
+        bot = BinMgr(args.config, jobs=args.jobs, stream=args.stream,
+                     config_required=args.command not in ('sync', 'serve', 'rollback'), force=args.force,
+                     log_level=args.log_level)
+        if args.command == 'resolve':
+            bot.resolve(Path(args.output), args.targets or [format_target(bot.github.arch, bot.github.libc)])
+        elif args.command == 'sync':
+            bot.sync(Path(args.lock))
+        elif args.command == 'rollback':
+            bot.rollback(args.program)
+        elif args.command == 'serve':
+            bot.serve(args.host, args.port)
+        elif args.check:
+            bot.check()
+        else:
+            bot.run()
     except Exception as e:
         logger = Logger(Path.home() / '.local' / 'bin' / 'logs')
         logger.error(f"Fatal error: {str(e)}")
         sys.exit(1)
+    finally:
+        if bot and args.report:
+            bot.report.save(Path(args.report).expanduser())
+        if bot and args.summary:
+            bot.print_summary()
+
+    # Let cron and CI notice programs that still failed after retrying
+    if bot.failed_programs:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
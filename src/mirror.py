@@ -0,0 +1,179 @@
+import json
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from download_cache import DownloadCache
+
+COPY_BUFFER_SIZE = 1024 * 1024
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class MirrorServer(ThreadingHTTPServer):
+    """
+    Serves the download cache and versions file to other binmgr clients on the network.
+
+    GET /index.json          cached asset URLs with their digests, plus the installed versions
+    GET /objects/<sha256>    a cached asset
+    GET /assets?url=<url>    redirects to the cached object downloaded from `url`
+
+    Objects support Range requests, and every response carries validators for conditional GETs.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], download_cache: DownloadCache, version_file: Path, logger):
+        super().__init__(address, MirrorRequestHandler)
+        self.download_cache = download_cache
+        self.version_file = version_file
+        self.logger = logger
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    server: MirrorServer
+    server_version = 'BinMgr-Mirror'
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug('%s ' + format, self.address_string(), *args)
+
+    def _handle(self, send_body: bool):
+        url = urlsplit(self.path)
+        if url.path == '/index.json':
+            self._send_index(send_body)
+        elif url.path.startswith('/objects/'):
+            self._send_object(url.path[len('/objects/'):], send_body)
+        elif url.path == '/assets':
+            self._redirect_asset(parse_qs(url.query).get('url', [''])[0])
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+
+    def _send_index(self, send_body: bool):
+        index = self.server.download_cache.snapshot()
+        versions = {}
+        if self.server.version_file.exists():
+            with open(self.server.version_file) as f:
+                versions = json.load(f)
+
+        assets = {url: {'sha256': digest, 'size': index['objects'][digest]['size']}
+                  for url, digest in index['urls'].items() if digest in index['objects']}
+        body = json.dumps({'assets': assets, 'versions': versions}, sort_keys=True).encode()
+        etag = f'"{DownloadCache.digest(body)[:32]}"'
+
+        if self._not_modified(etag, None):
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _redirect_asset(self, asset_url: str):
+        digest = self.server.download_cache.snapshot()['urls'].get(asset_url)
+        if not digest:
+            self.send_error(HTTPStatus.NOT_FOUND, "Asset not cached")
+            return
+        self.send_response(HTTPStatus.FOUND)
+        self.send_header('Location', f'/objects/{digest}')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_object(self, digest: str, send_body: bool):
+        path = self.server.download_cache.object_path(digest) if SHA256_PATTERN.match(digest) else None
+        if not path or not path.is_file():
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        stat = path.stat()
+        size = stat.st_size
+        # Objects are content-addressed, so the digest is a strong validator
+        etag = f'"{digest}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        if self._not_modified(etag, stat.st_mtime):
+            return
+
+        byte_range = self._parse_range(size, etag)
+        if byte_range == 'invalid':
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size - 1)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        if not send_body:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(COPY_BUFFER_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _not_modified(self, etag: str, mtime: Optional[float]) -> bool:
+        """Answer 304 when the client's validators still match"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            matches = if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        elif self.headers.get('If-Modified-Since') and mtime is not None:
+            try:
+                matches = int(mtime) <= parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError):
+                matches = False
+        else:
+            matches = False
+
+        if matches:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+        return matches
+
+    def _parse_range(self, size: int, etag: str):
+        """Parse a single-range `Range` header, returns (start, end), None for the whole file, or 'invalid'"""
+        header = self.headers.get('Range')
+        if not header or (self.headers.get('If-Range') and self.headers['If-Range'] != etag):
+            return None
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+        if not match or match.groups() == ('', ''):
+            return None
+
+        first, last = match.groups()
+        if first == '':
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start > end or start >= size:
+            return 'invalid'
+        return start, end
+
+
+def mirror_asset_url(mirror_url: str, asset_url: str, sha256: Optional[str] = None) -> str:
+    """URL of an asset on a mirror, by digest when it is known"""
+    if sha256:
+        return f'{mirror_url}/objects/{sha256}'
+    return f'{mirror_url}/assets?url={quote(asset_url, safe="")}'
@@ -0,0 +1,40 @@
+import os
+from typing import Dict, Tuple
+
+# Architectures binaries are selected for, each with the names releases and `uname` use for it
+ARCH_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'x86_64': ('x86_64', 'amd64', 'x64'),
+    'aarch64': ('aarch64', 'arm64'),
+}
+# C libraries binaries are selected for. musl builds are usually static and run anywhere, glibc builds need glibc.
+LIBCS = ('glibc', 'musl')
+
+
+def normalize_arch(arch: str) -> str:
+    """Canonical name of an architecture, raises ValueError for one binaries can't be selected for"""
+    name = arch.lower()
+    for canonical, aliases in ARCH_ALIASES.items():
+        if name in aliases:
+            return canonical
+    raise ValueError(f"Unsupported architecture {arch}, supported: {', '.join(ARCH_ALIASES)}")
+
+
+def system_libc() -> str:
+    """Get the C library of this system, 'glibc' or 'musl'"""
+    try:
+        return 'glibc' if os.confstr('CS_GNU_LIBC_VERSION') else 'musl'
+    except (AttributeError, ValueError, OSError):
+        # musl has no glibc version to report
+        return 'musl'
+
+
+def parse_target(target: str) -> Tuple[str, str]:
+    """Split an ARCH-LIBC target such as x86_64-musl into its canonical architecture and C library"""
+    arch, _, libc = target.rpartition('-')
+    if not arch or libc not in LIBCS:
+        raise ValueError(f"Invalid target {target}, expected ARCH-LIBC with LIBC one of {', '.join(LIBCS)}")
+    return normalize_arch(arch), libc
+
+
+def format_target(arch: str, libc: str) -> str:
+    return f'{arch}-{libc}'
@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class ReleaseCache:
+    def __init__(self, cache_file: Path):
+        self.cache_file = cache_file
+        self.entries = self._load_entries()
+        self._lock = threading.Lock()
+        # Repositories stored since loading, the only entries this process writes back
+        self._changed = set()
+
+    def _load_entries(self) -> Dict:
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                # A damaged cache only costs a full fetch, so start over
+                return {}
+        return {}
+
+    def get(self, repo: str) -> Optional[Dict]:
+        """Get the cached response for a repository"""
+        with self._lock:
+            return self.entries.get(repo)
+
+    def store(self, repo: str, etag: Optional[str], last_modified: Optional[str], body: Dict) -> None:
+        """Store a response along with its validators"""
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self.entries[repo] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'body': body
+            }
+            self._changed.add(repo)
+
+    def get_selection(self, repo: str, key: str, tag: str) -> Optional[str]:
+        """Get the asset chosen earlier for a release tag, `key` identifies what it was chosen for"""
+        with self._lock:
+            selection = self.entries.get(repo, {}).get('selections', {}).get(key)
+            return selection['asset'] if selection and selection['tag'] == tag else None
+
+    def store_selection(self, repo: str, key: str, tag: str, asset_name: str) -> None:
+        """Remember the asset chosen for a release tag, dropped along with the entry when a new response is stored"""
+        with self._lock:
+            entry = self.entries.setdefault(repo, {'etag': None, 'last_modified': None, 'body': None})
+            entry.setdefault('selections', {})[key] = {'tag': tag, 'asset': asset_name}
+            self._changed.add(repo)
+
+    def save(self) -> None:
+        """
+        Save cache to file if anything changed, replacing it in a single step so it is never left half written.
+        Entries saved by other runs since this one loaded the file are kept.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            entries = self._load_entries()
+            entries.update({repo: self.entries[repo] for repo in self._changed})
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.cache_file.with_name(f'.{self.cache_file.name}.{os.getpid()}.tmp')
+            with open(temp_file, 'w') as f:
+                # jetbrains bug requires `# type: ignore` (https://youtrack.jetbrains.com/issue/PY-76945)
+                json.dump(entries, f)  # type: ignore
+            os.replace(temp_file, self.cache_file)
+            self.entries = entries
+            self._changed.clear()
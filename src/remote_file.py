@@ -0,0 +1,104 @@
+import io
+from typing import Optional
+
+import requests
+
+# Read from the end of the file up front, enough for the zip end records and a small central directory
+TAIL_SIZE = 64 * 1024 + 22
+
+
+class RangeNotSupported(Exception):
+    """Raised when the server does not answer Range requests with partial content"""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file over HTTP Range requests.
+    The tail of the file is fetched once, other reads stream from an open-ended range
+    that is reused for as long as reads stay sequential.
+    """
+
+    def __init__(self, session: requests.Session, url: str):
+        super().__init__()
+        self._session = session
+        self.url = url
+        self._pos = 0
+        self._stream: Optional[requests.Response] = None
+        self._stream_pos = 0
+        self.requests_made = 0
+        self.bytes_fetched = 0
+
+        # Streamed, so a server that ignores Range is turned away before its body is read
+        with self._request(f'bytes=-{TAIL_SIZE}', stream=True) as response:
+            self.size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+            self._tail = response.content
+        self._tail_start = self.size - len(self._tail)
+        self.bytes_fetched += len(self._tail)
+
+    def _request(self, byte_range: str, stream: bool) -> requests.Response:
+        response = self._session.get(self.url, headers={'Range': byte_range}, stream=stream)
+        self.requests_made += 1
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code != 206 or '/' not in content_range or content_range.endswith('/*'):
+            response.close()
+            response.raise_for_status()
+            raise RangeNotSupported(f"Server did not honour Range request for {self.url}")
+        return response
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self._pos)
+        if length <= 0:
+            return 0
+
+        if self._pos >= self._tail_start:
+            offset = self._pos - self._tail_start
+            data = self._tail[offset:offset + length]
+        else:
+            data = self._read_stream(length)
+
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def _read_stream(self, length: int) -> bytes:
+        if self._stream is None or self._stream_pos != self._pos:
+            self._close_stream()
+            self._stream = self._request(f'bytes={self._pos}-', stream=True)
+            self._stream_pos = self._pos
+
+        data = self._stream.raw.read(length)
+        if not data:
+            raise IOError(f"Unexpected end of ranged response for {self.url}")
+        self._stream_pos += len(data)
+        self.bytes_fetched += len(data)
+        return data
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self._close_stream()
+        super().close()
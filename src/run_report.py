@@ -0,0 +1,146 @@
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# Phases shown in the summary table with their column headings, in the order they happen
+SUMMARY_PHASES = {
+    'release_lookup': 'lookup',
+    'asset_selection': 'select',
+    'checksum': 'checksum',
+    'download': 'download',
+    'extract': 'extract',
+    'find_binary': 'find',
+    'install': 'install',
+}
+
+
+class RunReport:
+    """
+    Per-phase timings and counters for one run.
+    Spans are recorded per program and written as JSON with `--report`.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.programs: Dict[str, Dict] = {}
+        self.counters: Dict[str, int] = {}
+
+    def _entry(self, program: str) -> Dict:
+        """Report entry of a program, caller must hold the lock"""
+        return self.programs.setdefault(program, {'status': None, 'attempts': 0, 'seconds': 0.0, 'spans': []})
+
+    @contextmanager
+    def program(self, program: str) -> Iterator[Dict]:
+        """
+        Time one attempt at a program. The yielded dict can be given a status and
+        other details, a raised exception marks the program as failed.
+        """
+        fields: Dict = {'status': 'ok'}
+        with self._lock:
+            entry = self._entry(program)
+            entry['attempts'] += 1
+            entry.pop('error', None)
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields.update(status='failed', error=str(e))
+            raise
+        finally:
+            with self._lock:
+                entry.update(fields)
+                entry['seconds'] = round(entry['seconds'] + time.perf_counter() - start, 6)
+
+    @contextmanager
+    def span(self, program: str, phase: str, **fields) -> Iterator[Dict]:
+        """Time a phase of a program, details like `bytes` can be added to the yielded dict"""
+        record = {'phase': phase, **fields}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            record['seconds'] = round(seconds, 6)
+            if record.get('bytes') and seconds > 0:
+                record['mb_per_s'] = round(record['bytes'] / 1e6 / seconds, 2)
+            with self._lock:
+                self._entry(program)['spans'].append(record)
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        """Add to a run-wide counter"""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def phase_totals(self) -> Dict[str, Dict]:
+        """Time spent in each phase summed over all programs"""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            for entry in self.programs.values():
+                for span in entry['spans']:
+                    total = totals.setdefault(span['phase'], {'count': 0, 'seconds': 0.0, 'bytes': 0})
+                    total['count'] += 1
+                    total['seconds'] = round(total['seconds'] + span['seconds'], 6)
+                    total['bytes'] += span.get('bytes') or 0
+        return totals
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            programs = copy.deepcopy(self.programs)
+            counters = dict(sorted(self.counters.items()))
+        return {
+            'host': os.uname().nodename,
+            'started_at': self.started_at.isoformat(),
+            'seconds': round(time.perf_counter() - self._start, 6),
+            'counters': counters,
+            'phases': self.phase_totals(),
+            'programs': programs,
+        }
+
+    def save(self, report_path: Path) -> None:
+        """Write the report as JSON"""
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = report_path.with_name(f'.{report_path.name}.tmp')
+        with open(temp_path, 'w') as f:
+            # jetbrains bug requires `# type: ignore` (https://youtrack.jetbrains.com/issue/PY-76945)
+            json.dump(self.to_dict(), f, indent=2)  # type: ignore
+        os.replace(temp_path, report_path)
+
+    def summary_lines(self) -> List[str]:
+        """Table of phase timings per program, in milliseconds"""
+        report = self.to_dict()
+        if not report['programs']:
+            return []
+        name_width = max(len('program'), *(len(name) for name in report['programs']))
+        columns = ['status', *SUMMARY_PHASES.values(), 'MB/s', 'total']
+        widths = [10] + [8] * (len(columns) - 1)
+        lines = ['  '.join([f"{'program':<{name_width}}"] +
+                           [f"{column:>{width}}" for column, width in zip(columns, widths)])]
+
+        for name, entry in sorted(report['programs'].items()):
+            seconds_by_phase: Dict[str, float] = {}
+            download_bytes = 0
+            download_seconds = 0.0
+            for span in entry['spans']:
+                seconds_by_phase[span['phase']] = seconds_by_phase.get(span['phase'], 0.0) + span['seconds']
+                if span['phase'] == 'download' and span.get('bytes'):
+                    download_bytes += span['bytes']
+                    download_seconds += span['seconds']
+            cells = [entry['status'] or '-']
+            cells += [f"{seconds_by_phase[phase] * 1000:.0f}" if phase in seconds_by_phase else '-'
+                      for phase in SUMMARY_PHASES]
+            cells.append(f"{download_bytes / 1e6 / download_seconds:.1f}" if download_seconds else '-')
+            cells.append(f"{entry['seconds'] * 1000:.0f}")
+            lines.append('  '.join([f"{name:<{name_width}}"] +
+                                   [f"{cell:>{width}}" for cell, width in zip(cells, widths)]))
+
+        counters = ', '.join(f"{name}={value}" for name, value in report['counters'].items())
+        lines.append(f"Run took {report['seconds']:.2f}s" + (f" ({counters})" if counters else ""))
+        return lines
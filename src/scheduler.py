@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {500, 502, 503, 504}
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class RateLimitExceeded(requests.RequestException):
+    """Raised when the API budget is spent and resets later than we are willing to wait"""
+
+
+class ScheduledSession(requests.Session):
+    """
+    Session that paces requests by the GitHub rate-limit headers and retries transient failures.
+
+    GitHub keeps a separate budget per resource, named by `X-RateLimit-Resource`, such as `core` for the
+    REST API and `graphql`. Before each request to `api_url` the session pauses if the budget of its resource
+    has fallen to `rate_limit_reserve`, until that budget resets. Requests to other hosts, like asset
+    downloads, are never paused. Connection errors, 5xx responses and rate-limited responses are retried
+    up to `max_retries` times with jittered exponential backoff, honouring `Retry-After`.
+    """
+
+    def __init__(self, logger, max_retries: int = 4, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 rate_limit_reserve: int = 2, max_rate_limit_wait: float = 300.0, pool_size: int = 10,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT, api_url: Optional[str] = None):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limit_reserve = rate_limit_reserve
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.timeout = timeout
+        self.api_url = api_url.rstrip('/') if api_url else None
+        self._logger = logger
+        self._lock = threading.Lock()
+        # Remaining requests and reset time per rate-limit resource
+        self._budgets: Dict[str, Tuple[int, float]] = {}
+        # Held while pausing for a resource, so requests for it wait without holding up other resources
+        self._pause_locks: Dict[str, threading.Lock] = {}
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        resource = self._resource(url)
+        attempt = 0
+        while True:
+            if resource:
+                self._wait_for_budget(resource)
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                self._logger.debug("%s %s failed (%s), retrying in %.1fs", method, url, e, delay)
+            else:
+                if resource:
+                    resource = self._update_budget(response, resource)
+                delay = self._retry_delay(response, attempt, resource)
+                if delay is None:
+                    return response
+                self._logger.debug("%s %s returned %d, retrying in %.1fs", method, url, response.status_code, delay)
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _resource(self, url: str) -> Optional[str]:
+        """Rate-limit resource a request is expected to count against, None for requests outside the API"""
+        if not self.api_url or not (url == self.api_url or url.startswith(self.api_url + '/')):
+            return None
+        return 'graphql' if url.rstrip('/') == f'{self.api_url}/graphql' else 'core'
+
+    def _retry_delay(self, response: requests.Response, attempt: int,
+                     resource: Optional[str] = None) -> Optional[float]:
+        """Seconds to wait before retrying a response, or None if it should be returned as is"""
+        if attempt >= self.max_retries:
+            return None
+
+        retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+        rate_limited = (response.status_code == 429 or
+                        (response.status_code == 403 and
+                         (retry_after is not None or response.headers.get('X-RateLimit-Remaining') == '0')))
+
+        if rate_limited:
+            delay = retry_after if retry_after is not None else self._seconds_until_reset(resource)
+            if delay is None:
+                delay = self._backoff(attempt)
+            return delay if delay <= self.max_rate_limit_wait else None
+
+        if response.status_code in RETRY_STATUSES:
+            return retry_after if retry_after is not None else self._backoff(attempt)
+        return None
+
+    def _update_budget(self, response: requests.Response, resource: str) -> str:
+        """Record the budget a response reports, returns the resource it was counted against"""
+        resource = response.headers.get('X-RateLimit-Resource') or resource
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return resource
+        try:
+            with self._lock:
+                self._budgets[resource] = (int(remaining), float(reset))
+        except ValueError:
+            pass
+        return resource
+
+    def _wait_for_budget(self, resource: str) -> None:
+        """Pause until the rate limit resets when the remaining budget of a resource is nearly spent"""
+        with self._lock:
+            pause_lock = self._pause_locks.setdefault(resource, threading.Lock())
+        with pause_lock:
+            with self._lock:
+                budget = self._budgets.get(resource)
+                if budget is None or budget[0] > self.rate_limit_reserve:
+                    return
+                wait = self._seconds_until_reset(resource)
+                if wait is None or wait <= 0:
+                    del self._budgets[resource]
+                    return
+            if wait > self.max_rate_limit_wait:
+                raise RateLimitExceeded(f"API rate limit for {resource} nearly exhausted ({budget[0]} left), "
+                                        f"resets in {wait:.0f}s")
+
+            self._logger.warning(f"API rate limit for {resource} nearly exhausted, pausing {wait:.0f}s until it "
+                                 f"resets")
+            time.sleep(wait)
+            with self._lock:
+                self._budgets.pop(resource, None)
+
+    def _seconds_until_reset(self, resource: Optional[str]) -> Optional[float]:
+        budget = self._budgets.get(resource) if resource else None
+        if budget is None:
+            return None
+        return max(0.0, budget[1] - time.time() + 1)
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
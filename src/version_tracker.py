@@ -1,13 +1,28 @@
+import fcntl
 import json
+import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 
 
 class VersionTracker:
-    def __init__(self, version_file: Path):
+    """
+    Installed versions, kept in memory and written to `version_file` by `flush`,
+    at most every `flush_interval` seconds while updating if an interval is given.
+    """
+
+    def __init__(self, version_file: Path, flush_interval: Optional[float] = None):
         self.version_file = version_file
+        self.lock_file = version_file.with_name(version_file.name + '.lock')
+        self.flush_interval = flush_interval
         self.versions = self._load_versions()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.monotonic()
 
     def _load_versions(self) -> Dict:
         if self.version_file.exists():
@@ -16,22 +31,146 @@ class VersionTracker:
         return {}
 
     def save_versions(self) -> None:
-        """Save versions to file"""
-        with open(self.version_file, 'w') as f:
+        """Save versions to file, replacing it in a single step so it is never left half written"""
+        self.version_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.version_file.with_name(f'.{self.version_file.name}.{os.getpid()}.tmp')
+        with open(temp_file, 'w') as f:
             # jetbrains bug requires `# type: ignore` (https://youtrack.jetbrains.com/issue/PY-76945)
             json.dump(self.versions, f, indent=2)  # type: ignore
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.version_file)
+
+    def flush(self) -> None:
+        """Save versions if anything changed since the last save"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._dirty:
+            self.save_versions()
+            self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def _changed(self) -> None:
+        """Record a change, saving it now if the flush interval has passed"""
+        self._dirty = True
+        if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    @contextmanager
+    def locked(self, on_wait: Optional[Callable[[], None]] = None):
+        """
+        Hold an advisory lock that serializes binmgr processes sharing this versions file.
+        Versions are reloaded once the lock is held and flushed before it is released.
+        """
+        self.version_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if on_wait:
+                    on_wait()
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                with self._lock:
+                    self.versions = self._load_versions()
+                    self._dirty = False
+                yield self
+            finally:
+                self.flush()
 
     def get_version(self, program: str) -> Optional[str]:
         """Get the current version"""
         return self.versions.get(program, {}).get('version')
 
-    def update_version(self, program: str, version: str, release_data: Dict) -> None:
-        """Update version information"""
-        self.versions[program] = {
-            'version': version,
-            'installation_date': datetime.now().isoformat(),
-            'release_date': release_data.get('published_at'),
-            'source_url': release_data.get('html_url'),
-            'checksum': release_data.get('body', '').find('SHA256')
-        }
-        self.save_versions()
+    def get_binary_sha256(self, program: str) -> Optional[str]:
+        """Get the digest of the installed binary"""
+        return self.versions.get(program, {}).get('binary_sha256')
+
+    def get_held_from(self, program: str) -> Optional[str]:
+        """Get the version a rollback moved away from, which updates skip until a newer release"""
+        return self.versions.get(program, {}).get('held_from')
+
+    def get_last_checked(self, program: str) -> Optional[float]:
+        """Get when the program was last checked for updates, as a Unix timestamp"""
+        return self.versions.get(program, {}).get('last_checked')
+
+    def mark_checked(self, program: str, checked_at: Optional[float] = None) -> None:
+        """Record that an installed program was checked for updates, programs never installed stay due"""
+        with self._lock:
+            entry = self.versions.get(program)
+            if not entry:
+                return
+            entry['last_checked'] = checked_at or time.time()
+            self._changed()
+
+    def get_history(self, program: str) -> List[Dict]:
+        """Get previously installed versions, newest first"""
+        return self.versions.get(program, {}).get('history', [])
+
+    def update_version(self, program: str, version: str, release_data: Dict, asset_sha256: Optional[str] = None,
+                       binary_sha256: Optional[str] = None, path: Optional[Path] = None) -> None:
+        """Update version information, moving the replaced version into the history"""
+        with self._lock:
+            previous = self.versions.get(program)
+            history = previous.pop('history', []) if previous else []
+            # Reinstalling a version from the history, after a rollback for example, takes it out of the history
+            history = [entry for entry in history if entry.get('version') != version]
+            if previous and previous.get('version') != version:
+                history.insert(0, previous)
+
+            self.versions[program] = {
+                'version': version,
+                'installation_date': datetime.now().isoformat(),
+                'release_date': release_data.get('published_at'),
+                'source_url': release_data.get('html_url'),
+                'asset_sha256': asset_sha256,
+                'binary_sha256': binary_sha256,
+                'path': str(path) if path else None,
+                'history': history
+            }
+            self._changed()
+
+    def get_stored(self, program: str, version: str) -> Optional[Dict]:
+        """Get the history entry of a previously installed version"""
+        return next((entry for entry in self.get_history(program) if entry.get('version') == version), None)
+
+    def rollback(self, program: str) -> Optional[Dict]:
+        """
+        Make the most recent previous version that is still installed the current one.
+        The version rolled back from goes to the front of the history, so rolling back again undoes it,
+        and is held: updates skip it until a newer release. Undoing a rollback releases the hold.
+        """
+        with self._lock:
+            current = self.versions.get(program)
+            if not current:
+                return None
+            history = current.pop('history', [])
+
+            for i, entry in enumerate(history):
+                if entry.get('path') and Path(entry['path']).is_file():
+                    restored = history.pop(i)
+                    held_from = current.pop('held_from', None)
+                    history.insert(0, current)
+                    restored['history'] = history
+                    if restored.get('version') != held_from:
+                        restored['held_from'] = current.get('version')
+                    self.versions[program] = restored
+                    self._changed()
+                    return restored
+
+            current['history'] = history
+            return None
+
+    def prune_history(self, program: str, keep: int) -> List[Dict]:
+        """Drop all but the `keep` most recent versions, counting the current one, returns the dropped entries"""
+        with self._lock:
+            history = self.get_history(program)
+            cutoff = max(keep - 1, 0)
+            removed = history[cutoff:]
+            if removed:
+                del history[cutoff:]
+                self._changed()
+            return removed
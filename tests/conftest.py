@@ -0,0 +1,45 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+sys.path.insert(0, str(ROOT_DIR / 'benchmarks'))
+
+from fake_github import FakeGitHub  # noqa: E402
+from logger import Logger  # noqa: E402
+
+
+@pytest.fixture
+def logger(tmp_path):
+    return Logger(tmp_path / 'logs')
+
+
+@pytest.fixture
+def fake_github():
+    with FakeGitHub(3, archive_kb=64, members=5) as fake:
+        yield fake
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def make_config(home):
+    """Factory writing a configuration for every program of a fake GitHub server"""
+    def make_config(fake: FakeGitHub, **settings) -> str:
+        config_path = home / 'config.json'
+        config_path.write_text(json.dumps({
+            'programs': {name: f'bench/{name}' for name in fake.program_names},
+            'api_url': fake.url,
+            'cache_dir': str(home / 'cache'),
+            **settings,
+        }))
+        return str(config_path)
+    return make_config
@@ -0,0 +1,118 @@
+import errno
+import gzip
+import io
+import os
+import stat
+import tarfile
+
+import pytest
+
+from binary_manager import BinaryManager
+from fake_github import build_archive, make_payload
+from github_api import GitHubAPI
+
+
+def test_stream_extract_tar_can_retry(tmp_path, logger):
+    binary_manager = BinaryManager(tmp_path / 'bin', tmp_path / 'temp', logger)
+    binary = make_payload(4096)
+    archive = build_archive('tool', 'tar.gz', binary, 5)
+    extract_dir = tmp_path / 'temp' / 'tool' / 'extracted'
+
+    for _ in range(2):
+        binary_path = binary_manager.stream_extract_tar(io.BytesIO(archive), extract_dir, 'tool')
+        assert binary_path.read_bytes() == binary
+
+
+def test_install_binary_trusts_the_recorded_digest(tmp_path, logger, monkeypatch):
+    binary_manager = BinaryManager(tmp_path / 'bin', tmp_path / 'temp', logger)
+    (tmp_path / 'bin').mkdir()
+    binary_path = tmp_path / 'tool'
+    binary_path.write_bytes(b'#!/bin/sh\n')
+    sha256, store_path = binary_manager.install_binary(binary_path, 'tool', 'v1')
+
+    hashed = []
+    monkeypatch.setattr(binary_manager, 'file_sha256', lambda path: hashed.append(path) or sha256)
+    binary_path.write_bytes(b'#!/bin/sh\n')
+    assert binary_manager.install_binary(binary_path, 'tool', 'v2', sha256) == (sha256, store_path)
+    assert hashed == [binary_path]
+
+    hashed.clear()
+    assert binary_manager.install_binary(binary_path, 'tool', 'v2') == (sha256, store_path)
+    assert hashed == [binary_path, tmp_path / 'bin' / 'tool']
+
+    hashed.clear()
+    installed = binary_manager.install_binary(binary_path, 'tool', 'v2', sha256, binary_sha256=sha256)
+    assert installed == (sha256, store_path)
+    assert hashed == []
+
+
+
+def _cross_device(source, destination):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+@pytest.mark.parametrize('copy_file_range', [
+    os.copy_file_range,
+    # Stops short without an error, as some filesystems do
+    lambda src, dst, count: 0,
+    None,
+])
+def test_install_binary_copies_across_filesystems(tmp_path, logger, monkeypatch, copy_file_range):
+    binary_manager = BinaryManager(tmp_path / 'bin', tmp_path / 'temp', logger)
+    (tmp_path / 'bin').mkdir()
+    binary = make_payload(1000)
+    binary_path = tmp_path / 'tool'
+    binary_path.write_bytes(binary)
+    binary_path.chmod(0o640)
+    monkeypatch.setattr(os, 'rename', _cross_device)
+    if copy_file_range is None:
+        monkeypatch.delattr(os, 'copy_file_range')
+    else:
+        monkeypatch.setattr(os, 'copy_file_range', copy_file_range)
+
+    sha256, store_path = binary_manager.install_binary(binary_path, 'tool', 'v1')
+
+    installed = tmp_path / 'bin' / 'tool'
+    assert installed.resolve() == store_path
+    assert installed.read_bytes() == binary
+    assert binary_manager.file_sha256(installed) == sha256
+    assert stat.S_IMODE(store_path.stat().st_mode) == 0o751
+    assert binary_path.exists()
+
+
+def _tar(binary: bytes, compression: str) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=f'w:{compression}') as archive:
+        info = tarfile.TarInfo('tool/tool')
+        info.size = len(binary)
+        info.mode = 0o755
+        archive.addfile(info, io.BytesIO(binary))
+    return buffer.getvalue()
+
+
+def _tar_zst(binary: bytes) -> bytes:
+    zstandard = pytest.importorskip('zstandard')
+    return zstandard.ZstdCompressor().compress(_tar(binary, ''))
+
+
+@pytest.mark.parametrize('asset_name, pack, extracted', [
+    ('tool-linux-amd64.gz', gzip.compress, 'tool'),
+    ('tool-linux-amd64', lambda binary: binary, 'tool'),
+    ('tool-linux-amd64.tar.xz', lambda binary: _tar(binary, 'xz'), 'tool/tool'),
+    ('tool-linux-amd64.tar.bz2', lambda binary: _tar(binary, 'bz2'), 'tool/tool'),
+    ('tool-linux-amd64.tar.zst', _tar_zst, 'tool/tool'),
+])
+def test_extract_archive_formats(tmp_path, logger, asset_name, pack, extracted):
+    binary_manager = BinaryManager(tmp_path / 'bin', tmp_path / 'temp', logger)
+    binary = make_payload(4096)
+    archive_path = tmp_path / asset_name
+    archive_path.write_bytes(pack(binary))
+    extract_dir = tmp_path / 'extracted'
+
+    paths = binary_manager.extract_archive(archive_path, GitHubAPI._get_archive_type(asset_name), extract_dir, 'tool')
+
+    assert extract_dir / extracted in paths
+    assert (extract_dir / extracted).read_bytes() == binary
+    assert os.access(extract_dir / extracted, os.X_OK)
+    # Raw binaries are copied, the downloaded file may be a cache object
+    assert archive_path.exists()
@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+
+import pytest
+
+from download_cache import DownloadCache
+
+
+def test_store_and_lookup(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', 1024 * 1024)
+    url = 'https://example.com/tool.tar.gz'
+    partial_path = cache.partial_path(url)
+    partial_path.write_bytes(b'asset')
+    sha256 = cache.digest(b'asset')
+
+    cached_path = cache.store(url, partial_path, sha256)
+
+    assert cached_path == cache.object_path(sha256)
+    assert cache.lookup(url) == cached_path
+    assert cache.lookup('https://example.com/other', sha256) == cached_path
+    assert cache.lookup('https://example.com/unknown') is None
+
+
+def test_claim_makes_a_second_download_wait(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', 1024 * 1024)
+    url = 'https://example.com/tool.tar.gz'
+    events = []
+
+    def download(name):
+        with cache.claim(url):
+            events.append(f'{name} start')
+            time.sleep(0.05)
+            events.append(f'{name} end')
+
+    threads = [threading.Thread(target=download, args=(name,)) for name in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert events[0].split()[0] == events[1].split()[0]
+    assert events[2].split()[0] == events[3].split()[0]
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason="root can write to any directory")
+def test_read_only_cache_misses(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', 1024 * 1024)
+    cache.ensure_directories()
+    assert (cache.cache_dir.stat().st_mode & 0o7777) == 0o2775
+    (cache.cache_dir / 'index.lock').touch(mode=0o444)
+    cache.cache_dir.chmod(0o555)
+    try:
+        assert cache.lookup('https://example.com/tool.tar.gz') is None
+    finally:
+        cache.cache_dir.chmod(0o2775)
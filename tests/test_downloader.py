@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+
+import pytest
+import requests
+
+import downloader
+from downloader import ChunkedDownloader
+from fake_github import FakeGitHub
+
+DATA = os.urandom(1024 * 1024 + 123)
+PART_COUNT = 4
+
+
+class InterruptingSession(requests.Session):
+    """Session that drops the connection of the ranged request starting at `interrupt_at`, after a few bytes"""
+
+    def __init__(self, interrupt_at: int, keep: int = 10000):
+        super().__init__()
+        self.interrupt_at = interrupt_at
+        self.keep = keep
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        if kwargs.get('headers', {}).get('Range', '').startswith(f'bytes={self.interrupt_at}-'):
+            chunks = response.iter_content
+
+            def iter_content(chunk_size=1, decode_unicode=False):
+                for chunk in chunks(chunk_size):
+                    yield chunk[:self.keep]
+                    raise requests.ConnectionError("Connection dropped")
+
+            response.iter_content = iter_content
+        return response
+
+
+@pytest.fixture
+def server():
+    with FakeGitHub(1, archive_kb=1, members=1) as fake:
+        fake.archives['tool0'] = DATA
+        yield fake
+
+
+@pytest.mark.parametrize('part', [0, 2])
+def test_interrupted_part_resumes(server, tmp_path, logger, monkeypatch, part):
+    monkeypatch.setattr(downloader, 'PARALLEL_MIN_SIZE', 64 * 1024)
+    dest_path = tmp_path / 'asset'
+    part_start = ChunkedDownloader._split(len(DATA), PART_COUNT)[part]['start']
+
+    with pytest.raises(requests.ConnectionError):
+        ChunkedDownloader(InterruptingSession(part_start), logger, PART_COUNT).download(server.asset_url('tool0'),
+                                                                                        dest_path)
+    state = json.loads(dest_path.with_name('asset.state').read_text())
+    assert len(state['parts']) == PART_COUNT
+    assert state['parts'][part]['next'] == part_start + 10000
+
+    server.stats['download_bytes'] = 0
+    sha256 = ChunkedDownloader(requests.Session(), logger, PART_COUNT).download(server.asset_url('tool0'), dest_path)
+
+    assert sha256 == hashlib.sha256(DATA).hexdigest()
+    assert dest_path.read_bytes() == DATA
+    assert not dest_path.with_name('asset.state').exists()
+    # Only what was missing is fetched again
+    assert server.stats['download_bytes'] == len(DATA) - sum(p['next'] - p['start'] for p in state['parts'])
+
+
+def test_single_part_download(server, tmp_path, logger):
+    dest_path = tmp_path / 'asset'
+    sha256 = ChunkedDownloader(requests.Session(), logger, PART_COUNT).download(server.asset_url('tool0'), dest_path)
+
+    assert sha256 == hashlib.sha256(DATA).hexdigest()
+    assert dest_path.read_bytes() == DATA
+    assert server.stats['range_requests'] == 1
+
+
+def test_download_without_ranges(tmp_path, logger):
+    with FakeGitHub(1, archive_kb=1, members=1, ranges=False) as fake:
+        fake.archives['tool0'] = DATA
+        dest_path = tmp_path / 'asset'
+        sha256 = ChunkedDownloader(requests.Session(), logger, PART_COUNT).download(fake.asset_url('tool0'), dest_path)
+
+        assert sha256 == hashlib.sha256(DATA).hexdigest()
+        assert dest_path.read_bytes() == DATA
+        assert fake.stats['range_requests'] == 0
+        assert not dest_path.with_name('asset.state').exists()
+
+
+def read_back_spy(monkeypatch):
+    """Record how many bytes are read back from disk to compute the digest"""
+    read_back = []
+    hash_written = ChunkedDownloader._hash_written
+
+    def spy(dest_path, parts, digest, hashed):
+        result = hash_written(dest_path, parts, digest, hashed)
+        read_back.append(result - hashed)
+        return result
+
+    monkeypatch.setattr(ChunkedDownloader, '_hash_written', staticmethod(spy))
+    return read_back
+
+
+def test_single_part_is_not_read_back(server, tmp_path, logger, monkeypatch):
+    read_back = read_back_spy(monkeypatch)
+    ChunkedDownloader(requests.Session(), logger, PART_COUNT).download(server.asset_url('tool0'), tmp_path / 'asset')
+    assert sum(read_back) == 0
+
+
+def test_only_later_parts_are_read_back(server, tmp_path, logger, monkeypatch):
+    monkeypatch.setattr(downloader, 'PARALLEL_MIN_SIZE', 64 * 1024)
+    read_back = read_back_spy(monkeypatch)
+    dest_path = tmp_path / 'asset'
+    sha256 = ChunkedDownloader(requests.Session(), logger, PART_COUNT).download(server.asset_url('tool0'), dest_path)
+
+    assert sha256 == hashlib.sha256(DATA).hexdigest()
+    first_part = ChunkedDownloader._split(len(DATA), PART_COUNT)[0]
+    assert sum(read_back) == len(DATA) - (first_part['end'] + 1)
+
+
+def interrupt(server, dest_path, logger, monkeypatch):
+    """Leave a partial ranged download of the server's asset behind"""
+    monkeypatch.setattr(downloader, 'PARALLEL_MIN_SIZE', 64 * 1024)
+    part_start = ChunkedDownloader._split(len(DATA), PART_COUNT)[1]['start']
+    with pytest.raises(requests.ConnectionError):
+        ChunkedDownloader(InterruptingSession(part_start), logger, PART_COUNT).download(server.asset_url('tool0'),
+                                                                                        dest_path)
+    assert json.loads(dest_path.with_name('asset.state').read_text())['validator']
+
+
+def test_replaced_asset_is_not_resumed(server, tmp_path, logger, monkeypatch):
+    dest_path = tmp_path / 'asset'
+    interrupt(server, dest_path, logger, monkeypatch)
+
+    # Re-uploaded with the same size
+    new_data = os.urandom(len(DATA))
+    server.archives['tool0'] = new_data
+    server.stats['download_bytes'] = 0
+    sha256 = ChunkedDownloader(requests.Session(), logger, PART_COUNT).download(server.asset_url('tool0'), dest_path)
+
+    assert sha256 == hashlib.sha256(new_data).hexdigest()
+    assert dest_path.read_bytes() == new_data
+    assert server.stats['download_bytes'] == len(new_data)
+
+
+class ReplacingSession(requests.Session):
+    """Session that replaces the server's asset right after the first probe of the download"""
+
+    def __init__(self, server, new_data: bytes):
+        super().__init__()
+        self.server = server
+        self.new_data = new_data
+
+    def head(self, url, **kwargs):
+        response = super().head(url, **kwargs)
+        if self.new_data:
+            self.server.archives['tool0'], self.new_data = self.new_data, None
+        return response
+
+
+def test_asset_replaced_during_a_resumed_download_starts_over(server, tmp_path, logger, monkeypatch):
+    dest_path = tmp_path / 'asset'
+    interrupt(server, dest_path, logger, monkeypatch)
+    new_data = os.urandom(len(DATA))
+
+    # The probe still sees the old file, so the download resumes, and the ranges requested
+    # with the old file's ETag are answered with the whole new file
+    session = ReplacingSession(server, new_data)
+    sha256 = ChunkedDownloader(session, logger, PART_COUNT).download(server.asset_url('tool0'), dest_path)
+
+    assert sha256 == hashlib.sha256(new_data).hexdigest()
+    assert dest_path.read_bytes() == new_data
+    assert not dest_path.with_name('asset.state').exists()
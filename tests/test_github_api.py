@@ -0,0 +1,187 @@
+import pytest
+
+from fake_github import FakeGitHub
+from github_api import GitHubAPI
+from release_cache import ReleaseCache
+from run_report import RunReport
+
+
+def test_graphql_batch_resolves_releases(logger, fake_github):
+    github = GitHubAPI(logger, api_url=fake_github.url, token='test')
+    repos = [f'bench/{name}' for name in fake_github.program_names] + ['bench/missing']
+
+    releases = github.get_latest_releases(repos)
+
+    assert set(releases) == {f'bench/{name}' for name in fake_github.program_names}
+    assert fake_github.stats['graphql_queries'] == 1
+    for name in fake_github.program_names:
+        release = releases[f'bench/{name}']
+        assert release['tag_name'] == fake_github.tag
+        asset, _ = github.find_linux_binary(release['assets'], name, 'x86_64')
+        assert asset['name'] == fake_github.asset_name(name, fake_github.tag)
+
+
+def test_unchanged_releases_are_revalidated(logger, fake_github, tmp_path):
+    cache_file = tmp_path / 'binmgr_release_cache.json'
+    repos = {name: f'bench/{name}' for name in fake_github.program_names}
+    release_cache = ReleaseCache(cache_file)
+    github = GitHubAPI(logger, release_cache, api_url=fake_github.url)
+    releases = {repo: github.get_latest_release(repo) for repo in repos.values()}
+    for name, repo in repos.items():
+        github.select_asset(repo, releases[repo], name)
+    release_cache.save()
+
+    # The next run sends the stored ETags, gets only 304s and uses the stored releases and asset choices
+    report = RunReport()
+    github = GitHubAPI(logger, ReleaseCache(cache_file), api_url=fake_github.url, report=report)
+    for name, repo in repos.items():
+        release = github.get_latest_release(repo)
+        assert release == releases[repo]
+        github.select_asset(repo, release, name)
+
+    assert fake_github.stats['releases'] == len(repos)
+    assert fake_github.stats['not_modified'] == len(repos)
+    assert report.counters == {'releases_not_modified': len(repos), 'asset_selections_reused': len(repos)}
+
+
+def test_new_release_replaces_the_cached_one(logger, fake_github, tmp_path):
+    release_cache = ReleaseCache(tmp_path / 'binmgr_release_cache.json')
+    github = GitHubAPI(logger, release_cache, api_url=fake_github.url)
+    github.select_asset('bench/tool0', github.get_latest_release('bench/tool0'), 'tool0')
+    assert release_cache.get('bench/tool0')['selections']
+
+    fake_github.tag = 'v2.0.0'
+    assert github.get_latest_release('bench/tool0')['tag_name'] == 'v2.0.0'
+
+    entry = release_cache.get('bench/tool0')
+    assert (entry['etag'], entry['body']['tag_name']) == ('"tool0-v2.0.0"', 'v2.0.0')
+    assert 'selections' not in entry
+    assert (fake_github.stats['releases'], fake_github.stats['not_modified']) == (2, 0)
+
+
+def test_graphql_leaves_paginated_assets_to_rest(logger):
+    with FakeGitHub(1, archive_kb=64, members=5, extra_assets=150) as fake:
+        github = GitHubAPI(logger, api_url=fake.url, token='test')
+        repo = f'bench/{fake.program_names[0]}'
+
+        assert github.get_latest_releases([repo]) == {}
+
+        release = github.get_latest_release(repo)
+        asset, _ = github.find_linux_binary(release['assets'], fake.program_names[0], 'x86_64')
+        assert asset['name'] == fake.asset_name(fake.program_names[0], fake.tag)
+
+
+@pytest.mark.parametrize('arch, expected', [
+    ('x86_64', 'tool-linux-amd64.tar.gz'),
+    ('amd64', 'tool-linux-amd64.tar.gz'),
+    ('aarch64', 'tool-linux-arm64.tar.gz'),
+    ('arm64', 'tool-linux-arm64.tar.gz'),
+])
+def test_arch_aliases_select_the_same_asset(logger, arch, expected):
+    github = GitHubAPI(logger, api_url='http://127.0.0.1:9')
+    assets = [{'name': name, 'size': 1, 'browser_download_url': f'http://127.0.0.1:9/{name}'}
+              for name in ('tool-linux-amd64.tar.gz', 'tool-linux-arm64.tar.gz', 'tool-darwin-arm64.tar.gz')]
+
+    asset, _ = github.find_linux_binary(assets, 'tool', arch)
+
+    assert asset['name'] == expected
+
+
+def test_unsupported_arch_is_rejected(logger):
+    github = GitHubAPI(logger, api_url='http://127.0.0.1:9')
+    assets = [{'name': 'tool-linux-amd64.tar.gz', 'size': 1, 'browser_download_url': 'http://127.0.0.1:9/x'}]
+
+    with pytest.raises(ValueError, match='Unsupported architecture armv7l'):
+        github.find_linux_binary(assets, 'tool', 'armv7l')
+
+
+@pytest.mark.parametrize('libc, expected', [
+    ('glibc', 'tool-x86_64-unknown-linux-gnu.tar.gz'),
+    ('musl', 'tool-x86_64-unknown-linux-musl.tar.gz'),
+])
+def test_libc_selects_the_asset(logger, libc, expected):
+    github = GitHubAPI(logger, api_url='http://127.0.0.1:9')
+    assets = [{'name': name, 'size': 1, 'browser_download_url': f'http://127.0.0.1:9/{name}'}
+              for name in ('tool-x86_64-unknown-linux-gnu.tar.gz', 'tool-x86_64-unknown-linux-musl.tar.gz')]
+    release = {'tag_name': 'v1', 'assets': assets}
+
+    asset, _ = github.select_asset('o/tool', release, 'tool', 'x86_64', libc)
+
+    assert asset['name'] == expected
+    assert github.is_compatible_binary('tool-x86_64-unknown-linux-gnu.tar.gz', 'x86_64', 'musl')[0] is False
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('tool-x86_64-unknown-linux-gnu', 'binary'),
+    ('tool-linux-amd64.bin', 'binary'),
+    ('tool_1.2.3_linux_amd64', 'binary'),
+    ('tool-v1.2.3', 'binary'),
+    ('tool-1.0-linux-x86_64', 'binary'),
+    ('tool-linux-amd64.tar.xz', 'tar'),
+    ('tool-linux-amd64.gz', 'gz'),
+    ('tool-linux-amd64.sha256', None),
+    ('tool_checksums', None),
+    ('tool-linux-amd64-sbom', None),
+    ('LICENSE', None),
+    ('tool-linux-amd64.sig', None),
+    ('tool-linux-amd64.deb', None),
+])
+def test_archive_type_of_raw_binaries(name, expected):
+    assert GitHubAPI._get_archive_type(name) == expected
+
+
+@pytest.mark.parametrize('assets, expected', [
+    # The program's name wins over the libc and the install cost
+    ([('other-x86_64-unknown-linux-gnu', 1_000_000), ('tool-x86_64-unknown-linux-musl.tar.bz2', 50_000_000)],
+     'tool-x86_64-unknown-linux-musl.tar.bz2'),
+    # The system's libc wins over the install cost
+    ([('tool-x86_64-unknown-linux-musl', 1_000_000), ('tool-x86_64-unknown-linux-gnu.tar.bz2', 50_000_000)],
+     'tool-x86_64-unknown-linux-gnu.tar.bz2'),
+    # Then faster decompression can outweigh a larger download
+    ([('tool-x86_64-unknown-linux-gnu.tar.bz2', 8_000_000), ('tool-x86_64-unknown-linux-gnu.tar.gz', 10_000_000)],
+     'tool-x86_64-unknown-linux-gnu.tar.gz'),
+    # And a raw binary needs no decompression at all
+    ([('tool-x86_64-unknown-linux-gnu.tar.gz', 10_000_000), ('tool-x86_64-unknown-linux-gnu', 10_500_000)],
+     'tool-x86_64-unknown-linux-gnu'),
+])
+def test_selection_order(logger, assets, expected):
+    github = GitHubAPI(logger, api_url='http://127.0.0.1:9')
+    assets = [{'name': name, 'size': size, 'browser_download_url': f'http://127.0.0.1:9/{name}'}
+              for name, size in assets]
+
+    for ordered in (assets, assets[::-1]):
+        asset, _ = github.find_linux_binary(ordered, 'tool', 'x86_64', 'glibc')
+        assert asset['name'] == expected
+
+
+class TextResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+LINUX_SHA256 = 'a' * 64
+DARWIN_SHA256 = 'd' * 64
+
+
+@pytest.mark.parametrize('files, expected', [
+    # Per-asset files of two platforms, named after the whole asset or after it without the archive suffix
+    ({'tool-darwin-arm64.sha256sum': DARWIN_SHA256, 'tool-linux-amd64.tar.gz.sha256': LINUX_SHA256}, LINUX_SHA256),
+    ({'tool-darwin-arm64.sha256sum': DARWIN_SHA256, 'tool-linux-amd64.sha256sum': LINUX_SHA256}, LINUX_SHA256),
+    # Another platform's file is never used, even when it is the only one
+    ({'tool-darwin-arm64.sha256sum': DARWIN_SHA256}, None),
+    # A combined file has to name the asset
+    ({'SHA256SUMS': f'{DARWIN_SHA256}  tool-darwin-arm64.tar.gz\n{LINUX_SHA256}  tool-linux-amd64.tar.gz\n'},
+     LINUX_SHA256),
+    ({'checksums.txt': DARWIN_SHA256}, None),
+])
+def test_checksum_file_must_belong_to_the_asset(logger, monkeypatch, files, expected):
+    github = GitHubAPI(logger, api_url='http://127.0.0.1:9')
+    texts = {f'http://127.0.0.1:9/{name}': text for name, text in files.items()}
+    monkeypatch.setattr(github.session, 'get', lambda url: TextResponse(texts[url]))
+    asset = {'name': 'tool-linux-amd64.tar.gz', 'browser_download_url': 'http://127.0.0.1:9/tool-linux-amd64.tar.gz'}
+    assets = [asset] + [{'name': name, 'browser_download_url': url} for name, url in zip(files, texts)]
+
+    assert github.get_asset_checksum(assets, asset) == expected
@@ -0,0 +1,107 @@
+import atexit
+import logging
+import threading
+import time
+
+import pytest
+
+from logger import Logger, _QueueHandler
+
+
+@pytest.fixture
+def fresh_logging():
+    """Let a test set up file logging from scratch, and stop its writer thread afterwards"""
+    binmgr_logger = logging.getLogger('binmgr')
+    handlers, level, listener = list(binmgr_logger.handlers), binmgr_logger.level, Logger._listener
+    Logger._listener = None
+    binmgr_logger.handlers = []
+    yield binmgr_logger
+    if Logger._listener is not None:
+        atexit.unregister(Logger._listener.stop)
+        # Tests stop the writer thread themselves to wait for the file to be written
+        if Logger._listener._thread is not None:
+            Logger._listener.stop()
+        for handler in Logger._listener.handlers:
+            handler.close()
+    Logger._listener = listener
+    binmgr_logger.handlers = handlers
+    binmgr_logger.setLevel(level)
+
+
+class Formatted:
+    """Format argument recording the thread it was formatted on"""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread())
+        return 'formatted'
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_buffered_output_keeps_file_timestamps(logger, capsys):
+    handler = RecordingHandler()
+    logger.logger.addHandler(handler)
+    try:
+        with logger.buffered():
+            logger.info("first", program='tool')
+            time.sleep(0.05)
+            logger.debug("second %d", 2, program='tool')
+            assert capsys.readouterr().out == ''
+    finally:
+        logger.logger.removeHandler(handler)
+
+    assert [record.getMessage() for record in handler.records] == ['[tool] first', '[tool] second 2']
+    assert handler.records[1].created - handler.records[0].created >= 0.04
+    assert '[tool] first' in capsys.readouterr().out
+
+
+def test_file_logging_is_set_up_once(tmp_path, fresh_logging):
+    log_dir = tmp_path / 'logs'
+    first, second = Logger(log_dir), Logger(log_dir)
+    assert not log_dir.exists()
+
+    first.info("one", program='tool')
+    second.warning("two")
+    Logger._listener.stop()
+
+    assert [type(handler) for handler in fresh_logging.handlers].count(_QueueHandler) == 1
+    lines = first.log_file.read_text().splitlines()
+    assert [line.split(' - ', 1)[1] for line in lines] == ['INFO - [tool] one', 'WARNING - two']
+    assert list(log_dir.iterdir()) == [first.log_file]
+
+
+def test_messages_are_formatted_on_the_writer_thread(tmp_path, fresh_logging):
+    logger = Logger(tmp_path / 'logs')
+    argument = Formatted()
+
+    logger.debug("value %s", argument, program='50%')
+    Logger._listener.stop()
+
+    # pytest's own log capture formats records on the calling thread as well
+    assert any(thread is not threading.current_thread() for thread in argument.threads)
+    assert logger.log_file.read_text().endswith('DEBUG - [50%] value formatted\n')
+
+
+def test_debug_messages_are_skipped_below_the_log_level(tmp_path, fresh_logging, capsys):
+    logger = Logger(tmp_path / 'logs', 'info')
+    argument = Formatted()
+
+    logger.debug("value %s", argument)
+    assert not logger.debug_enabled
+    assert Logger._listener is None
+    logger.info("written")
+    Logger._listener.stop()
+
+    assert argument.threads == []
+    assert logger.log_file.read_text().endswith('INFO - written\n')
+    assert capsys.readouterr().out.count('written') == 1
@@ -0,0 +1,156 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+import github_api
+from fake_github import FakeGitHub
+from github_api import GitHubAPI
+from lockfile import Lockfile
+from main import CHECK_STAGGER, BinMgr, main
+
+
+def test_stream_falls_back_to_full_download_without_ranges(home, make_config):
+    # tool1 is published as a zip, which --stream fetches with Range requests
+    with FakeGitHub(2, archive_kb=64, members=5, ranges=False) as fake:
+        bot = BinMgr(make_config(fake), stream=True)
+        bot.run()
+
+    assert not bot.failed_programs
+    for name in fake.program_names:
+        assert (home / '.local' / 'bin' / name).exists()
+    spans = [span for span in bot.report.programs['tool1']['spans'] if span['phase'] == 'download']
+    assert [span['source'] for span in spans] == ['range', 'github']
+
+
+def test_rollback_holds_the_version_rolled_back_from(home, make_config):
+    with FakeGitHub(1, archive_kb=64, members=5) as fake:
+        config_path = make_config(fake)
+        BinMgr(config_path).run()
+        fake.tag = 'v1.0.1'
+        BinMgr(config_path).run()
+
+        bot = BinMgr(config_path)
+        bot.rollback('tool0')
+        assert bot.version_tracker.get_held_from('tool0') == 'v1.0.1'
+
+        bot = BinMgr(config_path)
+        bot.run()
+        assert bot.version_tracker.get_version('tool0') == 'v1.0.0'
+        assert bot.report.programs['tool0']['status'] == 'held'
+        assert BinMgr(config_path).check() == {}
+
+        bot = BinMgr(config_path, force=True)
+        bot.run()
+        assert bot.version_tracker.get_version('tool0') == 'v1.0.1'
+        assert bot.version_tracker.get_held_from('tool0') is None
+        # The held version is switched back to from the store, and leaves the history
+        phases = [span['phase'] for span in bot.report.programs['tool0']['spans']]
+        assert 'download' not in phases and 'checksum' not in phases
+        assert [entry['version'] for entry in bot.version_tracker.get_history('tool0')] == ['v1.0.0']
+
+        BinMgr(config_path).rollback('tool0')
+        fake.tag = 'v1.0.2'
+        bot = BinMgr(config_path)
+        bot.run()
+        assert bot.version_tracker.get_version('tool0') == 'v1.0.2'
+        assert bot.version_tracker.get_held_from('tool0') is None
+
+
+def test_rolling_back_twice_releases_the_hold(home, make_config):
+    with FakeGitHub(1, archive_kb=64, members=5) as fake:
+        config_path = make_config(fake)
+        BinMgr(config_path).run()
+        fake.tag = 'v1.0.1'
+        BinMgr(config_path).run()
+
+        BinMgr(config_path).rollback('tool0')
+        bot = BinMgr(config_path)
+        bot.rollback('tool0')
+        assert bot.version_tracker.get_version('tool0') == 'v1.0.1'
+        assert bot.version_tracker.get_held_from('tool0') is None
+        assert (home / '.local' / 'bin' / 'tool0').resolve() == Path(bot.version_tracker.versions['tool0']['path'])
+
+
+@pytest.mark.parametrize('host, installed', [
+    (('x86_64', 'glibc'), True),
+    (('x86_64', 'musl'), False),
+])
+def test_resolve_pins_each_target_and_sync_picks_this_machine(home, make_config, monkeypatch, host, installed):
+    with FakeGitHub(2, archive_kb=64, members=5) as fake:
+        lock_path = home / 'binmgr.lock'
+        # The fake only publishes glibc builds
+        BinMgr(make_config(fake)).resolve(lock_path, ['x86_64-glibc', 'amd64-musl', 'arm64-glibc'])
+
+        lockfile = Lockfile.load(lock_path)
+        assert sorted(lockfile.targets) == ['aarch64-glibc', 'x86_64-glibc', 'x86_64-musl']
+        assert set(lockfile.get_programs('x86_64-glibc')) == set(fake.program_names)
+        assert lockfile.get_programs('x86_64-musl') == {}
+
+        arch, libc = host
+        monkeypatch.setattr(GitHubAPI, '_get_system_arch', lambda self: arch)
+        monkeypatch.setattr(github_api, 'system_libc', lambda: libc)
+        bot = BinMgr(config_required=False)
+        bot.sync(lock_path)
+        assert not bot.failed_programs
+        assert all((home / '.local' / 'bin' / name).exists() == installed for name in fake.program_names)
+
+
+def test_sync_refuses_a_target_missing_from_the_lockfile(home, make_config, monkeypatch):
+    with FakeGitHub(1, archive_kb=64, members=5) as fake:
+        lock_path = home / 'binmgr.lock'
+        BinMgr(make_config(fake)).resolve(lock_path, ['x86_64-glibc'])
+
+        monkeypatch.setattr(GitHubAPI, '_get_system_arch', lambda self: 'aarch64')
+        monkeypatch.setattr(github_api, 'system_libc', lambda: 'musl')
+        with pytest.raises(ValueError, match='no entries for target aarch64-musl'):
+            BinMgr(config_required=False).sync(lock_path)
+
+
+def test_check_interval_skips_programs_checked_recently(home, make_config, fake_github):
+    def release_requests():
+        return fake_github.stats['releases'] + fake_github.stats['not_modified']
+
+    config_path = make_config(fake_github, check_interval='1h')
+    bot = BinMgr(config_path)
+    bot.run()
+    for name in fake_github.program_names:
+        last_checked = bot.version_tracker.get_last_checked(name)
+        assert last_checked + 3600 * (1 - CHECK_STAGGER) <= bot._next_check(name) <= last_checked + 3600
+
+    requests_made = release_requests()
+    bot = BinMgr(config_path)
+    bot.run()
+    assert release_requests() == requests_made
+    assert bot.report.counters['programs_skipped'] == len(fake_github.program_names)
+
+    BinMgr(config_path, force=True).run()
+    assert release_requests() == requests_made + len(fake_github.program_names)
+
+    # A per-program interval overrides the global one
+    config = json.loads(Path(config_path).read_text())
+    config['programs']['tool0'] = {'repo': 'bench/tool0', 'check_interval': 0}
+    Path(config_path).write_text(json.dumps(config))
+    requests_made = release_requests()
+    bot = BinMgr(config_path)
+    bot.run()
+    assert release_requests() == requests_made + 1
+    assert bot.report.counters['programs_skipped'] == len(fake_github.program_names) - 1
+
+
+def test_failures_are_retried_without_prompting_and_exit_with_1(home, make_config, fake_github, monkeypatch):
+    programs = {name: f'bench/{name}' for name in fake_github.program_names}
+    config_path = make_config(fake_github, programs=dict(programs, missing='bench/missing'), retry_failed=2)
+    report_path = home / 'report.json'
+    monkeypatch.setattr('builtins.input', lambda *args: pytest.fail("prompted for input"))
+    monkeypatch.setattr(sys, 'argv', ['binmgr', '--config', config_path, '--report', str(report_path)])
+
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+
+    assert exit_info.value.code == 1
+    report = json.loads(report_path.read_text())
+    assert report['programs']['missing']['attempts'] == 3
+    assert report['programs']['missing']['status'] == 'failed'
+    assert all(report['programs'][name]['status'] == 'updated' for name in fake_github.program_names)
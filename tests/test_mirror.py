@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from download_cache import DownloadCache
+from fake_github import FakeGitHub
+from main import BinMgr
+from mirror import MirrorServer, mirror_asset_url
+
+ASSET_URL = 'https://github.com/bench/tool/releases/download/v1/tool.tar.gz'
+DATA = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def mirror(tmp_path, logger):
+    cache = DownloadCache(tmp_path / 'cache', 1024 * 1024)
+    partial_path = cache.partial_path(ASSET_URL)
+    partial_path.write_bytes(DATA)
+    sha256 = cache.digest(DATA)
+    cache.store(ASSET_URL, partial_path, sha256)
+
+    server = MirrorServer(('127.0.0.1', 0), cache, tmp_path / 'versions.json', logger)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', sha256
+    server.shutdown()
+    server.server_close()
+
+
+def test_object_range(mirror):
+    mirror_url, sha256 = mirror
+    response = requests.get(mirror_asset_url(mirror_url, ASSET_URL, sha256), headers={'Range': 'bytes=100-199'})
+
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(DATA)}'
+    assert response.content == DATA[100:200]
+
+    response = requests.get(f'{mirror_url}/objects/{sha256}', headers={'Range': 'bytes=-10'})
+    assert response.status_code == 206
+    assert response.content == DATA[-10:]
+
+    response = requests.get(f'{mirror_url}/objects/{sha256}', headers={'Range': f'bytes={len(DATA)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+def test_object_if_range(mirror):
+    mirror_url, sha256 = mirror
+    url = f'{mirror_url}/objects/{sha256}'
+
+    response = requests.get(url, headers={'Range': 'bytes=0-9', 'If-Range': f'"{sha256}"'})
+    assert response.status_code == 206
+    assert response.content == DATA[:10]
+
+    # A changed validator means the client's partial copy is stale, so the whole object is sent
+    response = requests.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_conditional_get(mirror):
+    mirror_url, sha256 = mirror
+    url = f'{mirror_url}/objects/{sha256}'
+    response = requests.get(url)
+    assert response.status_code == 200
+
+    assert requests.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert requests.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+    assert requests.get(url, headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+    index = requests.get(f'{mirror_url}/index.json')
+    assert index.json()['assets'][ASSET_URL]['sha256'] == sha256
+    assert requests.get(f'{mirror_url}/index.json', headers={'If-None-Match': index.headers['ETag']}).status_code == 304
+
+
+def test_redirect_by_url(mirror):
+    mirror_url, sha256 = mirror
+    response = requests.get(mirror_asset_url(mirror_url, ASSET_URL))
+    assert response.status_code == 200
+    assert response.url == f'{mirror_url}/objects/{sha256}'
+    assert requests.get(mirror_asset_url(mirror_url, 'https://example.com/other')).status_code == 404
+
+
+def test_unreachable_mirror_is_skipped_for_the_run(make_config):
+    with FakeGitHub(4, archive_kb=64, members=5) as fake:
+        # Nothing listens on the discard port
+        bot = BinMgr(make_config(fake, mirror_url='http://127.0.0.1:9'), jobs=1)
+        start = time.monotonic()
+        bot.run()
+
+    assert not bot.failed_programs
+    assert bot.report.counters['mirror_misses'] == 1
+    assert time.monotonic() - start < 5
+
+
+def test_mirror_with_a_bad_copy_falls_back_to_github(home, make_config, logger):
+    with FakeGitHub(1, archive_kb=64, members=5, digests=True) as fake:
+        # The mirror holds a damaged copy of tool0's archive under the right digest
+        mirror_cache = DownloadCache(home / 'mirror', 1024 * 1024)
+        archive = fake.archives['tool0']
+        partial_path = mirror_cache.partial_path('bad')
+        partial_path.write_bytes(archive[:-100] + bytes(100))
+        mirror_cache.store('bad', partial_path, DownloadCache.digest(archive))
+
+        server = MirrorServer(('127.0.0.1', 0), mirror_cache, home / 'versions.json', logger)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            bot = BinMgr(make_config(fake, mirror_url=f'http://127.0.0.1:{server.server_port}'), jobs=1)
+            bot.run()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    assert not bot.failed_programs
+    assert bot.report.counters['mirror_misses'] == 1
+    assert 'mirror_downloads' not in bot.report.counters
+    assert (home / '.local' / 'bin' / 'tool0').exists()
+    # GitHub's copy replaced the bad one, and no partial download is left to resume
+    assert bot.download_cache.object_path(DownloadCache.digest(archive)).read_bytes() == archive
+    assert not list(bot.download_cache.partial_dir.glob('*/*'))
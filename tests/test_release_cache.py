@@ -0,0 +1,23 @@
+import json
+
+from release_cache import ReleaseCache
+
+
+def test_save_keeps_entries_of_other_runs(tmp_path):
+    cache_file = tmp_path / 'binmgr_release_cache.json'
+    waiting = ReleaseCache(cache_file)
+    earlier = ReleaseCache(cache_file)
+
+    earlier.store('o/a', '"a"', None, {'tag_name': 'v1'})
+    earlier.save()
+    waiting.store('o/b', '"b"', None, {'tag_name': 'v2'})
+    waiting.save()
+
+    assert set(json.loads(cache_file.read_text())) == {'o/a', 'o/b'}
+    assert [path.name for path in tmp_path.iterdir()] == [cache_file.name]
+
+
+def test_damaged_file_starts_over(tmp_path):
+    cache_file = tmp_path / 'binmgr_release_cache.json'
+    cache_file.write_text('{"o/a": ')
+    assert ReleaseCache(cache_file).get('o/a') is None
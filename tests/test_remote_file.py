@@ -0,0 +1,78 @@
+import io
+import os
+import zipfile
+
+import pytest
+import requests
+
+from binary_manager import BinaryManager
+from fake_github import FakeGitHub
+from remote_file import TAIL_SIZE, HTTPRangeFile, RangeNotSupported
+
+
+class RecordingSession(requests.Session):
+    """Session that keeps every response, to check what was read from them"""
+
+    def __init__(self):
+        super().__init__()
+        self.responses = []
+
+    def request(self, *args, **kwargs):
+        response = super().request(*args, **kwargs)
+        self.responses.append(response)
+        return response
+
+
+def large_zip(binary: bytes) -> bytes:
+    """A zip where the program binary is a small part of the archive"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for i in range(8):
+            archive.writestr(f'tool/share/data-{i}.bin', os.urandom(64 * 1024))
+        info = zipfile.ZipInfo('tool/tool')
+        info.external_attr = 0o100755 << 16
+        archive.writestr(info, binary)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def range_server():
+    with FakeGitHub(1, archive_kb=1, members=1) as fake:
+        yield fake
+
+
+def test_reads_match_the_file(range_server):
+    data = os.urandom(3 * TAIL_SIZE)
+    range_server.archives['tool0'] = data
+    with HTTPRangeFile(requests.Session(), range_server.asset_url('tool0')) as remote_file:
+        assert remote_file.size == len(data)
+        assert remote_file.read(100) == data[:100]
+        remote_file.seek(-10, io.SEEK_END)
+        assert remote_file.read() == data[-10:]
+        remote_file.seek(TAIL_SIZE)
+        assert remote_file.read(TAIL_SIZE) == data[TAIL_SIZE:2 * TAIL_SIZE]
+    assert range_server.stats['range_requests'] == 3
+
+
+def test_zip_member_fetch_reads_part_of_the_archive(range_server, tmp_path, logger):
+    binary = os.urandom(16 * 1024)
+    archive = large_zip(binary)
+    range_server.archives['tool0'] = archive
+    binary_manager = BinaryManager(tmp_path / 'bin', tmp_path / 'temp', logger)
+
+    with HTTPRangeFile(requests.Session(), range_server.asset_url('tool0')) as remote_file:
+        binary_path = binary_manager.extract_zip_member(remote_file, tmp_path / 'extracted', 'tool')
+        assert binary_path.read_bytes() == binary
+        assert remote_file.bytes_fetched < remote_file.size == len(archive)
+    assert range_server.stats['download_bytes'] < len(archive) / 2
+
+
+def test_server_without_ranges_is_not_downloaded(tmp_path):
+    with FakeGitHub(1, archive_kb=1024, members=1, ranges=False) as fake:
+        session = RecordingSession()
+        with pytest.raises(RangeNotSupported):
+            HTTPRangeFile(session, fake.asset_url('tool0'))
+
+    assert len(session.responses) == 1
+    assert session.responses[0].status_code == 200
+    assert not session.responses[0]._content_consumed
@@ -0,0 +1,70 @@
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+from main import BinMgr, main
+from run_report import SUMMARY_PHASES
+
+
+def test_report_of_an_install_and_a_no_op_run(home, make_config, fake_github, monkeypatch, capsys):
+    config_path = make_config(fake_github)
+    bot = BinMgr(config_path)
+    bot.run()
+    report_path = home / 'reports' / 'install.json'
+    bot.report.save(report_path)
+
+    report = json.loads(report_path.read_text())
+    assert list(report) == ['host', 'started_at', 'seconds', 'counters', 'phases', 'programs']
+    assert report['host'] == os.uname().nodename
+    assert datetime.fromisoformat(report['started_at']).tzinfo is not None
+    assert report['counters']['releases_fetched'] == len(fake_github.program_names)
+    assert [path.name for path in report_path.parent.iterdir()] == [report_path.name]
+
+    download_bytes = 0
+    for name in fake_github.program_names:
+        entry = report['programs'][name]
+        assert (entry['status'], entry['attempts']) == ('updated', 1)
+        assert entry['current_version'] is None and entry['latest_version'] == fake_github.tag
+        phases = [span['phase'] for span in entry['spans']]
+        assert phases == ['release_lookup', 'asset_selection', 'checksum', 'download', 'extract', 'find_binary',
+                          'install']
+        download = entry['spans'][phases.index('download')]
+        assert download['bytes'] == len(fake_github.archives[name])
+        assert download['mb_per_s'] > 0
+        download_bytes += download['bytes']
+    assert report['phases']['download'] == {'count': len(fake_github.program_names),
+                                            'seconds': report['phases']['download']['seconds'],
+                                            'bytes': download_bytes}
+
+    report_path = home / 'reports' / 'no-op.json'
+    monkeypatch.setattr(sys, 'argv', ['binmgr', '--config', config_path, '--report', str(report_path), '--summary'])
+    capsys.readouterr()
+    main()
+
+    report = json.loads(report_path.read_text())
+    assert report['counters'] == {'releases_not_modified': len(fake_github.program_names)}
+    assert {entry['status'] for entry in report['programs'].values()} == {'up_to_date'}
+
+    # Terminal output is coloured
+    lines = re.sub(r'\x1b\[\d+m', '', capsys.readouterr().out).splitlines()
+    header = next(i for i, line in enumerate(lines) if 'program' in line and 'status' in line)
+    assert lines[header].split()[2:-2] == list(SUMMARY_PHASES.values())
+    programs = len(fake_github.program_names)
+    for name, line in zip(sorted(fake_github.program_names), lines[header + 1:]):
+        cells = line.split()
+        # Only the release lookup happened, the other phases and the download speed are empty
+        assert cells[:2] == [name, 'up_to_date'] and cells[2].isdigit()
+        assert cells[3:-1] == ['-'] * len(SUMMARY_PHASES)
+    assert f'releases_not_modified={programs}' in lines[header + 1 + programs]
+
+
+def test_failed_program_is_reported_with_its_error(home, make_config, fake_github):
+    bot = BinMgr(make_config(fake_github, programs={'missing': 'bench/missing'}, retry_failed=1))
+    bot.run()
+
+    entry = bot.report.to_dict()['programs']['missing']
+    assert (entry['status'], entry['attempts']) == ('failed', 2)
+    assert '404' in entry['error']
+    assert bot.report.summary_lines()[1].split()[:2] == ['missing', 'failed']
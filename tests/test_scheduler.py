@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fake_github import FakeGitHub
+from github_api import GitHubAPI
+from scheduler import RateLimitExceeded, ScheduledSession
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers with the server's scripted (status, headers) responses in order, then with 200"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        status, headers = self.server.responses.pop(0) if self.server.responses else (200, {})
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+    server.daemon_threads = True
+    server.responses, server.paths = [], []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record sleeps instead of sleeping, with backoff always at its upper bound"""
+    sleeps = []
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    return sleeps
+
+
+def rate_limited_response(resource: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 3600),
+                             'X-RateLimit-Resource': resource})
+    return response
+
+
+def test_only_api_requests_are_gated(logger):
+    session = ScheduledSession(logger, api_url='https://api.github.com')
+
+    assert session._resource('https://api.github.com/repos/o/r/releases/latest') == 'core'
+    assert session._resource('https://api.github.com/graphql') == 'graphql'
+    assert session._resource('https://github.com/o/r/releases/download/v1/r.tar.gz') is None
+    assert session._resource('https://api.github.com.example.com/graphql') is None
+
+
+def test_budgets_are_kept_per_resource(logger):
+    session = ScheduledSession(logger, api_url='https://api.github.com', max_rate_limit_wait=0)
+    assert session._update_budget(rate_limited_response('graphql'), 'core') == 'graphql'
+
+    session._wait_for_budget('core')
+    with pytest.raises(RateLimitExceeded, match='graphql'):
+        session._wait_for_budget('graphql')
+
+
+def test_spent_graphql_budget_leaves_rest_lookups(logger):
+    # Two GraphQL queries reach the reserve of 2 left
+    with FakeGitHub(2, archive_kb=16, members=1, rate_limit=4) as fake:
+        github = GitHubAPI(logger, api_url=fake.url, token='test', max_rate_limit_wait=0)
+        repos = [f'bench/{name}' for name in fake.program_names]
+        github.get_latest_releases(repos)
+        github.get_latest_releases(repos)
+
+        with pytest.raises(RateLimitExceeded):
+            github.get_latest_releases(repos)
+        assert github.get_latest_release(repos[0])['tag_name'] == fake.tag
+
+
+
+def get(server, logger, **settings) -> requests.Response:
+    session = ScheduledSession(logger, api_url=server.url, **settings)
+    return session.get(f'{server.url}/repos/o/r/releases/latest')
+
+
+def test_server_errors_are_retried_with_backoff(server, logger, sleeps):
+    server.responses = [(503, {}), (502, {})]
+
+    assert get(server, logger).status_code == 200
+    assert sleeps == [1, 2]
+    assert len(server.paths) == 3
+
+
+def test_retries_stop_after_max_retries(server, logger, sleeps):
+    server.responses = [(500, {})] * 5
+
+    assert get(server, logger, max_retries=3).status_code == 500
+    assert sleeps == [1, 2, 4]
+    assert len(server.paths) == 4
+
+
+# Headers are built when the test runs, as some hold times
+@pytest.mark.parametrize('status, headers, low, high', [
+    (503, lambda now: {'Retry-After': '7'}, 7, 7),
+    (503, lambda now: {'Retry-After': formatdate(now + 30, usegmt=True)}, 25, 30),
+    # Rate limited without Retry-After: until the reported reset, or backoff without one
+    (403, lambda now: {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(now) + 20)}, 15, 21),
+    (429, lambda now: {}, 1, 1),
+])
+def test_retry_waits_follow_the_response(server, logger, sleeps, status, headers, low, high):
+    server.responses = [(status, headers(time.time()))]
+
+    assert get(server, logger).status_code == 200
+    # Sleeps don't pass time here, so a spent budget is waited for again before the retry
+    assert low <= sleeps[0] <= high
+    assert len(server.paths) == 2
+
+
+@pytest.mark.parametrize('status, headers', [
+    # Rate limited for longer than the run is willing to wait
+    (429, lambda now: {'Retry-After': '600'}),
+    (403, lambda now: {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(now) + 600)}),
+    # Forbidden for another reason
+    (403, lambda now: {'X-RateLimit-Remaining': '10'}),
+    (404, lambda now: {}),
+])
+def test_responses_returned_without_retrying(server, logger, sleeps, status, headers):
+    server.responses = [(status, headers(time.time()))]
+
+    assert get(server, logger, max_rate_limit_wait=300).status_code == status
+    assert sleeps == []
+    assert len(server.paths) == 1
@@ -0,0 +1,89 @@
+import json
+import multiprocessing
+import time
+
+import pytest
+
+from version_tracker import VersionTracker
+
+
+def read_after_lock(version_file, events):
+    tracker = VersionTracker(version_file)
+    with tracker.locked(lambda: events.put('waiting')):
+        events.put(tracker.get_version('tool'))
+
+
+def test_second_process_waits_for_the_lock_and_sees_its_writes(tmp_path):
+    version_file = tmp_path / 'binmgr_versions.json'
+    # A forked child would inherit the open lock file and keep the lock held
+    context = multiprocessing.get_context('spawn')
+    events = context.Queue()
+    tracker = VersionTracker(version_file)
+
+    with tracker.locked():
+        tracker.update_version('tool', 'v1', {})
+        waiting = context.Process(target=read_after_lock, args=(version_file, events))
+        waiting.start()
+        assert events.get(timeout=10) == 'waiting'
+
+    assert events.get(timeout=10) == 'v1'
+    waiting.join(timeout=10)
+    assert waiting.exitcode == 0
+
+
+def test_updates_are_saved_on_flush_or_once_the_interval_passed(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+
+    version_file = tmp_path / 'binmgr_versions.json'
+    tracker = VersionTracker(version_file)
+    tracker.update_version('tool', 'v1', {})
+    assert not version_file.exists()
+    tracker.flush()
+    assert json.loads(version_file.read_text())['tool']['version'] == 'v1'
+
+    tracker = VersionTracker(version_file, flush_interval=60)
+    tracker.update_version('tool', 'v2', {})
+    assert json.loads(version_file.read_text())['tool']['version'] == 'v1'
+    clock[0] += 60
+    tracker.update_version('other', 'v1', {})
+    assert set(json.loads(version_file.read_text())) == {'tool', 'other'}
+
+
+def test_failed_save_keeps_the_old_file(tmp_path, monkeypatch):
+    version_file = tmp_path / 'binmgr_versions.json'
+    tracker = VersionTracker(version_file)
+    tracker.update_version('tool', 'v1', {})
+    tracker.flush()
+    saved = version_file.read_text()
+
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(json, 'dump', fail)
+    tracker.update_version('tool', 'v2', {})
+    with pytest.raises(OSError):
+        tracker.flush()
+
+    assert version_file.read_text() == saved
+    leftovers = [path.name for path in tmp_path.iterdir() if path != version_file]
+    assert len(leftovers) == 1 and leftovers[0].endswith('.tmp')
+
+
+def test_mark_checked_only_records_installed_programs(tmp_path):
+    tracker = VersionTracker(tmp_path / 'binmgr_versions.json')
+    tracker.mark_checked('missing', 100.0)
+    tracker.update_version('tool', 'v1', {})
+    tracker.mark_checked('tool', 100.0)
+
+    assert 'missing' not in tracker.versions
+    assert tracker.get_last_checked('tool') == 100.0
+
+
+def test_reinstalled_version_leaves_the_history(tmp_path):
+    tracker = VersionTracker(tmp_path / 'binmgr_versions.json')
+    for version in ('v1', 'v2', 'v1', 'v2'):
+        tracker.update_version('tool', version, {})
+
+    assert tracker.get_version('tool') == 'v2'
+    assert [entry['version'] for entry in tracker.get_history('tool')] == ['v1']